@@ -1,4 +1,6 @@
 import os
+import requests
+from requests.adapters import HTTPAdapter
 import streamlit as st
 
 # API Configuration
@@ -38,6 +40,14 @@ def get_api_url():
 
 API_URL = get_api_url()
 
+@st.cache_resource
+def get_api_session():
+    """Keep-alive Session für alle Backend-Aufrufe, geteilt über Reruns und Sessions"""
+    session = requests.Session()
+    session.mount("http://", HTTPAdapter(pool_connections=2, pool_maxsize=4, max_retries=0))
+    session.mount("https://", HTTPAdapter(pool_connections=2, pool_maxsize=4, max_retries=0))
+    return session
+
 # Debug-Modus
 DEBUG = os.getenv("DEBUG", "false").lower() == "true"
 
@@ -15,6 +15,7 @@ import osmnx as ox
 import geopandas as gpd
 from shapely.geometry import Polygon as ShapelyPolygon, LineString
 import hashlib
+from functools import lru_cache
 from utils.custom_styles import apply_chart_styling, apply_kpi_styles
 from utils.map_utils import (
     update_map_view_to_project_bounds,
@@ -22,6 +23,7 @@ from utils.map_utils import (
     create_pydeck_geojson_layer,
     create_pydeck_path_layer,
     create_pydeck_access_route_layer,
+    SITE_COLOR,
 )
 from utils.dashoboard_utils import (
     parse_time_from_string,
@@ -31,7 +33,6 @@ from utils.dashoboard_utils import (
     build_hourly_layer_cache,
 )
 from filelock import FileLock
-import re
 from config import API_URL  # Import centralized config
 
 
@@ -64,6 +65,31 @@ DEFAULT_CAPACITY = 200
 ENABLE_ANIMATION = True
 
 
+# Static layouts of the traffic tab charts, passed to go.Figure instead of an update_layout per rerun
+DAILY_TRAFFIC_LAYOUT = dict(
+    xaxis_title=None,
+    xaxis=dict(tickfont=dict(color='#0F05A0')),
+    yaxis_title="Fahrzeuge insgesamt",
+    yaxis=dict(tickfont=dict(color='#0F05A0'), titlefont=dict(color='#0F05A0')),
+    margin=dict(l=10, r=10, t=30, b=10),
+    height=220,
+    paper_bgcolor='rgba(0,0,0,0)',
+    plot_bgcolor='rgba(0,0,0,0)',
+    font=dict(color='#0F05A0')
+)
+HOURLY_TRAFFIC_LAYOUT = dict(
+    xaxis=dict(title="Stunde des ausgewählten Tages"),
+    yaxis=dict(title="Verkehrsaufkommen", titlefont=dict(color="#0F05A0"), tickfont=dict(color="#0F05A0"), side="left"),
+    yaxis2=dict(title="Verkehrsbelastung", titlefont=dict(color="#d62728"), tickfont=dict(color="#d62728"), anchor="x", overlaying="y", side="right", range=[0, 1]),
+    yaxis3=dict(title="Lieferungen", titlefont=dict(color="#2ca02c"), tickfont=dict(color="#2ca02c"), anchor="free", overlaying="y", side="right", position=0.85, showgrid=False),
+    legend=dict(orientation="h", yanchor="bottom", y=1.1, xanchor="center", x=0.5),
+    margin=dict(l=10,r=10,t=50,b=10), 
+    height=280,
+    paper_bgcolor='rgba(0,0,0,0)', 
+    plot_bgcolor='rgba(0,0,0,0)',
+    font_color='#0F05A0'
+)
+
 def _render_traffic_tab(project):
     """Render the traffic dashboard tab content"""
     st.markdown("<h2 style='text-align: center;'>Verkehrs-Dashboard</h2>", unsafe_allow_html=True)
@@ -409,12 +435,9 @@ def _render_traffic_tab(project):
     
     daily_totals_ts = []
     if base_osm_segments: # Only calculate if we have segments
-        daily_totals_ts = [
-            sum(
-                get_traffic_data(dt.strftime("%Y-%m-%d"), hr, project, base_osm_segments)["stats"]["total_traffic"]
-                for hr in range(start_hour, end_hour + 1)
-            ) for dt in dates_ts
-        ]
+        week_table = hourly_stats_table([dt.strftime("%Y-%m-%d") for dt in dates_ts], range(start_hour, end_hour + 1),
+                                        project, base_osm_segments, fields=("total_traffic",))
+        daily_totals_ts = week_table["total_traffic"].sum(axis=1).tolist()
     else: # Provide zeros or placeholder if no segments
         daily_totals_ts = [0] * len(dates_ts)
 
@@ -425,18 +448,8 @@ def _render_traffic_tab(project):
         german_day = german_weekdays.get(english_day, d.strftime("%a"))
         x_labels.append(f"{german_day}, {d.strftime('%d.%m')}")
 
-    fig_daily = go.Figure(data=[go.Bar(x=x_labels, y=daily_totals_ts, name="Total Daily Traffic", marker_color="#0F05A0")])
-    fig_daily.update_layout(
-        xaxis_title=None,
-        xaxis=dict(tickfont=dict(color='#0F05A0')),
-        yaxis_title="Fahrzeuge insgesamt",
-        yaxis=dict(tickfont=dict(color='#0F05A0'), titlefont=dict(color='#0F05A0')),
-        margin=dict(l=10, r=10, t=30, b=10),
-        height=220,
-        paper_bgcolor='rgba(0,0,0,0)',
-        plot_bgcolor='rgba(0,0,0,0)',
-        font=dict(color='#0F05A0')
-    )
+    fig_daily = go.Figure(data=[go.Bar(x=x_labels, y=daily_totals_ts, name="Total Daily Traffic", marker_color="#0F05A0")],
+                          layout=DAILY_TRAFFIC_LAYOUT)
     st.plotly_chart(fig_daily, use_container_width=True)
     st.markdown("<hr>", unsafe_allow_html=True)
     
@@ -448,32 +461,18 @@ def _render_traffic_tab(project):
     hourly_deliveries_hr = []
 
     if base_osm_segments: # Only calculate if we have segments
-        for h_loop in range(start_hour, end_hour + 1):
-            hourly_data = get_traffic_data(selected_date_str_for_map, h_loop, project, base_osm_segments)
-            hourly_traffic_hr.append(hourly_data["stats"]["total_traffic"])
-            hourly_congestion_hr.append(hourly_data["stats"]["average_congestion"])
-            hourly_deliveries_hr.append(hourly_data["stats"]["deliveries_count"])
+        day_table = hourly_stats_table([selected_date_str_for_map], range(start_hour, end_hour + 1), project, base_osm_segments)
+        hourly_traffic_hr, hourly_congestion_hr, hourly_deliveries_hr = (day_table[field][0].tolist() for field in HOURLY_STAT_FIELDS)
     else: # Provide zeros or placeholder if no segments
         hourly_traffic_hr = [0] * len(hours_list_hr)
         hourly_congestion_hr = [0] * len(hours_list_hr)
         hourly_deliveries_hr = [0] * len(hours_list_hr)
     
-    fig_hourly = go.Figure()
-    fig_hourly.add_trace(go.Bar(x=hours_list_hr, y=hourly_traffic_hr, name="Verkehrsaufkommen", marker_color="#0F05A0", opacity=0.7))
-    fig_hourly.add_trace(go.Scatter(x=hours_list_hr, y=hourly_congestion_hr, mode="lines+markers", name="Verkehrsbelastung", line=dict(color="#d62728"), yaxis="y2"))
-    fig_hourly.add_trace(go.Scatter(x=hours_list_hr, y=hourly_deliveries_hr, mode="lines+markers", name="Lieferungen", line=dict(color="#2ca02c", dash="dot"), marker=dict(size=7), yaxis="y3"))
-    fig_hourly.update_layout(
-        xaxis=dict(title="Stunde des ausgewählten Tages"),
-        yaxis=dict(title="Verkehrsaufkommen", titlefont=dict(color="#0F05A0"), tickfont=dict(color="#0F05A0"), side="left"),
-        yaxis2=dict(title="Verkehrsbelastung", titlefont=dict(color="#d62728"), tickfont=dict(color="#d62728"), anchor="x", overlaying="y", side="right", range=[0, 1]),
-        yaxis3=dict(title="Lieferungen", titlefont=dict(color="#2ca02c"), tickfont=dict(color="#2ca02c"), anchor="free", overlaying="y", side="right", position=0.85, showgrid=False),
-        legend=dict(orientation="h", yanchor="bottom", y=1.1, xanchor="center", x=0.5),
-        margin=dict(l=10,r=10,t=50,b=10), 
-        height=280,
-        paper_bgcolor='rgba(0,0,0,0)', 
-        plot_bgcolor='rgba(0,0,0,0)',
-        font_color='#0F05A0'
-    )
+    fig_hourly = go.Figure(data=[
+        go.Bar(x=hours_list_hr, y=hourly_traffic_hr, name="Verkehrsaufkommen", marker_color="#0F05A0", opacity=0.7),
+        go.Scatter(x=hours_list_hr, y=hourly_congestion_hr, mode="lines+markers", name="Verkehrsbelastung", line=dict(color="#d62728"), yaxis="y2"),
+        go.Scatter(x=hours_list_hr, y=hourly_deliveries_hr, mode="lines+markers", name="Lieferungen", line=dict(color="#2ca02c", dash="dot"), marker=dict(size=7), yaxis="y3"),
+    ], layout=HOURLY_TRAFFIC_LAYOUT)
     st.plotly_chart(fig_hourly, use_container_width=True)
 
     # --- Update PyDeck Map Layers ---
@@ -486,8 +485,8 @@ def _render_traffic_tab(project):
         polygon_layer = create_pydeck_geojson_layer(
             data=[polygon_feature], 
             layer_id="dashboard_project_polygon", 
-            fill_color=[70, 130, 180, 160], 
-            line_color=[70, 130, 180, 160],
+            fill_color=SITE_COLOR,
+            line_color=SITE_COLOR,
             get_line_width=20,
             line_width_min_pixels=2,
             pickable=True, 
@@ -768,12 +767,30 @@ def get_base_osm_segments(project):
             else:
                  st.sidebar.write(f"OSM: Map bounds for {project_id}: {map_bounds['coordinates'][0][:2]}...") 
 
-        st.session_state.base_osm_segments = generate_osm_traffic_segments(map_bounds, project_id)
+        st.session_state.base_osm_segments = shared_osm_segments(map_bounds, project_id)
         st.session_state.current_project_id_for_osm = project_id
         if DEBUG_OSM:
             st.sidebar.info(f"OSM: Stored {len(st.session_state.base_osm_segments)} base segments in session state.")
     return st.session_state.base_osm_segments
 
+class _NoOsmSegments(Exception):
+    """Raised by _cached_osm_segments on an empty (possibly transient) result, so cache_resource doesn't store it."""
+
+@st.cache_resource(ttl=3600, max_entries=8, show_spinner=False)
+def _cached_osm_segments(project_map_bounds, project_id):
+    segments = generate_osm_traffic_segments(project_map_bounds, project_id)
+    if not segments:
+        raise _NoOsmSegments()
+    return segments
+
+def shared_osm_segments(project_map_bounds, project_id):
+    """Base OSM segments per project and map bounds, built once and shared by all sessions and pages (read-only).
+    Empty results (missing bounds, OSM errors) are returned but not cached, so the next run retries."""
+    try:
+        return _cached_osm_segments(project_map_bounds, project_id)
+    except _NoOsmSegments:
+        return []
+
 def generate_osm_traffic_segments(project_map_bounds, project_id):
     """
     Fetches road network data from OpenStreetMap within the given map_bounds,
@@ -962,11 +979,12 @@ def _preprocess_schedule_df(schedule_df):
 
 # Get daily deliveries (integer) according to 1 + ceil(material/10) rule
 def _daily_deliveries_total(date_str: str, project) -> int:
-    aggr = _daily_schedule_aggregates(project)
-    row = aggr[aggr["date"] == date_str]
-    if row.empty:
-        return 0
-    return int(row.iloc[0]["deliveries"])
+    cache_key = f"schedule_daily_deliveries_{project.get('id','default')}"
+    if cache_key not in st.session_state:
+        # date -> deliveries, built once from the grouped aggregates instead of scanning them per call
+        aggr = _daily_schedule_aggregates(project)
+        st.session_state[cache_key] = dict(zip(aggr["date"].tolist(), aggr["deliveries"].astype(int).tolist()))
+    return st.session_state[cache_key].get(date_str, 0)
 
 # Pre-defined hourly weight distribution (07-17) – two peaks at 10 & 14, zero at 12
 _HOURLY_WEIGHTS_RAW = {
@@ -1025,6 +1043,16 @@ def get_hourly_construction_deliveries(date_str: str, hour: int, project) -> flo
 
     return alloc.get(hour, 0)
 
+@lru_cache(maxsize=512)
+def _parse_date_str(date_str):
+    """YYYY-MM-DD -> date, memoized: get_traffic_data parses the same few dates for every hour."""
+    return datetime.strptime(date_str, "%Y-%m-%d").date()
+
+@lru_cache(maxsize=65536)
+def _segment_hash(segment_id_str):
+    """md5 of a segment id as int; the per-segment random factors are derived from it for every hour."""
+    return int(hashlib.md5(segment_id_str.encode()).hexdigest(), 16)
+
 def get_traffic_data(date_str, hour, project, base_osm_segments=None, skip_cached=False):
     """Get traffic data for a specific date and hour.
     Uses counter profiles for statistical summaries and
@@ -1044,7 +1072,7 @@ def get_traffic_data(date_str, hour, project, base_osm_segments=None, skip_cache
     if not skip_cached:
         # Determine which week this date belongs to
         try:
-            date_obj = datetime.strptime(date_str, "%Y-%m-%d").date()
+            date_obj = _parse_date_str(date_str)
             year, week_num, _ = date_obj.isocalendar()
             week_cache_key = f"traffic_data_week_{year}_{week_num}_{project.get('id', 'default')}"
             
@@ -1073,7 +1101,7 @@ def get_traffic_data(date_str, hour, project, base_osm_segments=None, skip_cache
             if 7 <= hour <= 9 or 16 <= hour <= 18: time_factor_default = 0.6
             elif 10 <= hour <= 15: time_factor_default = 0.4
             for osm_segment_item in base_osm_segments:
-                try: seg_hash_rand = (int(hashlib.md5(str(osm_segment_item["segment_id"]).encode()).hexdigest(),16)%50+10)/100.0
+                try: seg_hash_rand = (_segment_hash(str(osm_segment_item["segment_id"]))%50+10)/100.0
                 except: seg_hash_rand = np.random.uniform(0.1,0.6)
                 sim_vol = osm_segment_item["capacity"] * seg_hash_rand * time_factor_default
                 sim_vol = min(sim_vol, osm_segment_item["capacity"] * 1.2)
@@ -1085,7 +1113,7 @@ def get_traffic_data(date_str, hour, project, base_osm_segments=None, skip_cache
                     "name": osm_segment_item.get("name", "N/A"), "highway_type": osm_segment_item.get("highway_type", "N/A"),
                 })
         return {"date": date_str, "hour": hour, "traffic_segments": simulated_osm_segments_for_pydeck, "congestion_points": [], "stats": {"total_traffic": 0, "average_congestion": 0, "deliveries_count": 0, "access_traffic": 0, "construction_traffic": 0, "construction_share_pct": 0}}
-    current_date_obj_calc = datetime.strptime(date_str, "%Y-%m-%d").date()
+    current_date_obj_calc = _parse_date_str(date_str)
     total_traffic_counters, weighted_cong_sum_counters, num_primary_c, num_secondary_c = 0,0,0,0
     for profile_id_calc, profile_meta_calc in st.session_state.counter_profiles.items():
         vehicles_calc = get_station_traffic(profile_meta_calc, current_date_obj_calc, hour)
@@ -1115,7 +1143,7 @@ def get_traffic_data(date_str, hour, project, base_osm_segments=None, skip_cache
             seg_cap = osm_seg_item.get('capacity',DEFAULT_CAPACITY); seg_cap = DEFAULT_CAPACITY if seg_cap==0 else seg_cap
             min_u,max_u=util_factors.get(osm_seg_item['highway_type'],default_util)
             hourly_driven_u=min_u+(max_u-min_u)*time_factor_curr
-            try: seg_hash_rand_f=(int(hashlib.md5(str(osm_seg_item['segment_id']).encode()).hexdigest(),16)%71+30)/100.0
+            try: seg_hash_rand_f=(_segment_hash(str(osm_seg_item['segment_id']))%71+30)/100.0
             except: seg_hash_rand_f=np.random.uniform(0.6,0.9)
             final_u_rate=hourly_driven_u*seg_hash_rand_f; final_u_rate=max(0.005,min(final_u_rate,1.0))
             sim_volume_calc=seg_cap*final_u_rate
@@ -1151,6 +1179,25 @@ def get_traffic_data(date_str, hour, project, base_osm_segments=None, skip_cache
 
     return {"date": date_str, "hour": hour, "traffic_segments": simulated_osm_segments_for_pydeck, "congestion_points": [], "stats": {"total_traffic": int(total_traffic_counters), "average_congestion": avg_cong_counters, "deliveries_count": deliveries_calc, "access_traffic": access_traffic_hour, "construction_traffic": total_construction_traffic, "construction_share_pct": (deliveries_calc * 2 / access_traffic_hour * 100) if access_traffic_hour else 0}}
 
+HOURLY_STAT_FIELDS = ("total_traffic", "average_congestion", "deliveries_count")
+
+def hourly_stats_table(date_strs, hours, project, base_osm_segments, fields=HOURLY_STAT_FIELDS):
+    """Collect the hourly stats of several days as {field: array of shape (len(date_strs), len(hours))},
+    so day and hour aggregates are array reductions. Hours are read in one pass from the week store
+    filled by preload_traffic_data_for_week; only hours missing there are simulated. Each array keeps
+    the dtype of its stat, so vehicle and delivery counts stay integers."""
+    hours = list(hours)
+    project_id = project.get('id', 'default')
+    hour_stats = []
+    for date_str in date_strs:
+        year, week_num, _ = _parse_date_str(date_str).isocalendar()
+        day_store = st.session_state.get(f"traffic_data_week_{year}_{week_num}_{project_id}", {}).get(date_str, {})
+        for hour in hours:
+            hour_data = day_store.get(hour) or get_traffic_data(date_str, hour, project, base_osm_segments, skip_cached=True)
+            hour_stats.append(hour_data["stats"])
+    shape = (len(date_strs), len(hours))
+    return {field: np.array([stats.get(field, 0) for stats in hour_stats]).reshape(shape) for field in fields}
+
 def get_station_traffic(profile_meta, date_obj, hour):
     """Get traffic count for a specific station, date and hour from its profile data."""
     if 'data' not in profile_meta:
@@ -1273,28 +1320,19 @@ def _daily_schedule_aggregates(project):
 
     sched = _preprocess_schedule_df(sched)
 
-    # Helper to compute deliveries per row
-    def _row_deliveries(mat):
-        try:
-            # Strip any non-numeric parts (like 21Kran1211510 -> 21)
-            mat_str = str(mat)
-            # Extract numeric prefix if it exists
-            numeric_part = re.match(r'^\d+', mat_str)
-            if numeric_part:
-                mat_val = float(numeric_part.group(0))
-            else:
-                # Try direct conversion, will raise ValueError if not possible
-                mat_val = float(mat_str)
-        except Exception:
-            mat_val = 0.0
-        return max(1, int(np.ceil(mat_val / 10.0))) if mat_val > 0 else 0
-
     # Convert Material to numeric safely, coercing errors to NaN
     sched["_material_numeric"] = pd.to_numeric(sched["Material"], errors="coerce")
     # Fill NaN with 0
     sched["_material_numeric"] = sched["_material_numeric"].fillna(0.0)
-    # Calculate deliveries
-    sched["_deliveries_row"] = sched["Material"].apply(_row_deliveries)
+    # Calculate deliveries per row: numeric prefix of Material (like 21Kran1211510 -> 21), else the
+    # whole value; at least one delivery per 10 units for positive material, none otherwise
+    material_str = sched["Material"].astype(str)
+    numeric_prefix = pd.to_numeric(material_str.str.extract(r'^(\d+)', expand=False), errors="coerce")
+    material_val = np.nan_to_num(
+        numeric_prefix.fillna(pd.to_numeric(material_str.str.strip(), errors="coerce")).to_numpy(dtype=float),
+        nan=0.0, posinf=0.0, neginf=0.0
+    )
+    sched["_deliveries_row"] = np.where(material_val > 0, np.maximum(1, np.ceil(material_val / 10.0)), 0).astype(int)
     
     # Safe conversion for Personen column too
     sched["_persons_numeric"] = pd.to_numeric(sched["Personen"], errors="coerce").fillna(0.0)
@@ -1319,6 +1357,13 @@ def _daily_schedule_aggregates(project):
     return aggr
 
 
+# Construction statistics charts: subheader, aggregate column, axis title, bar colour
+SCHEDULE_STAT_CHARTS = (
+    ("Personen auf der Baustelle (pro Tag)", "persons", "Personen", "#1f77b4"),
+    ("Material (Einheiten) pro Tag", "material", "Material", "#2ca02c"),
+    ("Lieferungen pro Tag", "deliveries", "Lieferungen", "#d62728"),
+)
+
 def _render_construction_stats_tab(project):
     """Render the second tab with three time-series histograms."""
     aggr_df = _daily_schedule_aggregates(project)
@@ -1326,30 +1371,33 @@ def _render_construction_stats_tab(project):
         st.warning("Keine Daten im Bauzeitplan gefunden.")
         return
 
-    # Convert date col to datetime for Plotly
-    aggr_df["date_dt"] = pd.to_datetime(aggr_df["date"])
-
-    # Common layout tweaks
-    def _base_bar(x, y, name, color):
-        fig = go.Figure(data=[go.Bar(x=x, y=y, marker_color=color, width=24 * 60 * 60 * 1000 * 0.7)])
-        fig.update_layout(
-            xaxis=dict(rangeslider=dict(visible=True), type="date"),
-            yaxis_title=name,
-            height=250,
-            margin=dict(l=10, r=10, t=30, b=10),
-            paper_bgcolor="rgba(0,0,0,0)",
-            plot_bgcolor="rgba(0,0,0,0)",
-        )
-        return fig
-
-    st.subheader("Personen auf der Baustelle (pro Tag)")
-    st.plotly_chart(_base_bar(aggr_df["date_dt"], aggr_df["persons"], "Personen", "#1f77b4"), use_container_width=True)
+    # Figures depend only on the cached aggregates, so they are built once per project and reused
+    figs_key = f"schedule_stat_figs_{project.get('id','default')}"
+    if figs_key not in st.session_state:
+        # Convert date col to datetime for Plotly
+        dates_dt = pd.to_datetime(aggr_df["date"])
+
+        # Common layout tweaks
+        def _base_bar(x, y, name, color):
+            fig = go.Figure(data=[go.Bar(x=x, y=y, marker_color=color, width=24 * 60 * 60 * 1000 * 0.7)])
+            fig.update_layout(
+                xaxis=dict(rangeslider=dict(visible=True), type="date"),
+                yaxis_title=name,
+                height=250,
+                margin=dict(l=10, r=10, t=30, b=10),
+                paper_bgcolor="rgba(0,0,0,0)",
+                plot_bgcolor="rgba(0,0,0,0)",
+            )
+            return fig
 
-    st.subheader("Material (Einheiten) pro Tag")
-    st.plotly_chart(_base_bar(aggr_df["date_dt"], aggr_df["material"], "Material", "#2ca02c"), use_container_width=True)
+        st.session_state[figs_key] = [
+            (title, _base_bar(dates_dt, aggr_df[column], name, color))
+            for title, column, name, color in SCHEDULE_STAT_CHARTS
+        ]
 
-    st.subheader("Lieferungen pro Tag")
-    st.plotly_chart(_base_bar(aggr_df["date_dt"], aggr_df["deliveries"], "Lieferungen", "#d62728"), use_container_width=True)
+    for title, fig in st.session_state[figs_key]:
+        st.subheader(title)
+        st.plotly_chart(fig, use_container_width=True)
 
 def show_dashboard(project):
     """Show the dashboard for visualizing traffic simulation results"""
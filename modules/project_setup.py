@@ -3,42 +3,83 @@ import pandas as pd
 import json
 import requests
 import os
+import threading
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, date, time
+from io import BytesIO
 import pydeck as pdk
 import numpy as np
-from io import BytesIO
-import math
-import holidays
-from utils.map_utils import update_map_view_to_project_bounds
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+from shapely.errors import GEOSException
+from shapely.geometry import shape
+from utils.map_utils import update_map_view_to_bounds, submit_geojson_uploads, create_pydeck_geojson_layer
 from utils.custom_styles import apply_custom_styles, apply_chart_styling
-from config import API_URL  # Import centralized config
+from config import API_URL, get_api_session  # Import centralized config
 
 # API_URL is now imported from config.py
 
+# Profile CSVs use English weekday names
+WEEKDAYS_DE_TO_EN = {
+    "Montag": "Monday", "Dienstag": "Tuesday", "Mittwoch": "Wednesday", "Donnerstag": "Thursday",
+    "Freitag": "Friday", "Samstag": "Saturday", "Sonntag": "Sunday"
+}
+MONTHS_DE = ["Januar", "Februar", "März", "April", "Mai", "Juni", "Juli", "August",
+             "September", "Oktober", "November", "Dezember"]
+# Preview table labels: marker for the primary station, "HH:00" row labels
+PRIMARY_MARKER = "🔴"
+HOUR_LABELS = tuple(f"{h:02d}:00" for h in range(24))
+
+# Columns of data/prepared/counters.csv used for the station selection
+STATION_COLUMNS = frozenset(('counter_id', 'name', 'direction', 'display_name', 'lat', 'lon', 'coordinates'))
+DEFAULT_STATION_COORDS = (47.3769, 8.5417) # Zürich centre, [lat, lon]
+
 # --- PyDeck Map Helper Functions (Copied from streamlit_app.py for direct use) ---
-def create_geojson_feature(geometry, properties=None):
-    '''Wraps a GeoJSON geometry into a GeoJSON Feature structure.'''
+def create_geojson_feature(geometry, properties=None, allowed_keys=None):
+    '''Wraps a GeoJSON geometry into a GeoJSON Feature structure.
+
+    If allowed_keys is given, only those properties are kept so unused attributes
+    of uploaded files are not serialized to the map.'''
     if properties is None: properties = {}
+    if allowed_keys is not None:
+        properties = {k: properties[k] for k in allowed_keys if k in properties}
     return {"type": "Feature", "geometry": geometry, "properties": properties}
 
-def create_pydeck_geojson_layer(
-    data, layer_id, fill_color=[255, 255, 255, 100], line_color=[0, 0, 0, 200],
-    line_width_min_pixels=1, get_line_width=10, opacity=0.5, stroked=True, filled=True,
-    extruded=False, wireframe=True, pickable=False, tooltip_html=None, auto_highlight=True,
-    highlight_color=[0, 0, 128, 128]
-):
-    '''Creates a PyDeck GeoJsonLayer with specified parameters.'''
-    layer_config = {
-        "id": layer_id, "data": data, "opacity": opacity, "stroked": stroked, "filled": filled,
-        "extruded": extruded, "wireframe": wireframe, "get_fill_color": fill_color,
-        "get_line_color": line_color, "get_line_width": get_line_width,
-        "line_width_min_pixels": line_width_min_pixels, "pickable": pickable,
-        "auto_highlight": auto_highlight, "highlight_color": highlight_color
-    }
-    if tooltip_html and pickable: layer_config["tooltip"] = {"html": tooltip_html}
-    return pdk.Layer("GeoJsonLayer", **layer_config)
+# Properties the setup preview layers actually read (tooltips)
+PREVIEW_FEATURE_KEYS = ("name",)
+
+# Styles of the four GeoJSON upload previews, keyed by layer id
+PREVIEW_LAYER_STYLES = {
+    "setup_construction_site_preview": dict(
+        fill_color=(220, 53, 69, 160), line_color=(220, 53, 69, 255), # Reddish
+        pickable=True, tooltip_html="<b>{properties.name}</b>"
+    ),
+    "setup_access_routes_preview": dict(
+        fill_color=(40, 167, 69, 160), line_color=(40, 167, 69, 255), # Greenish
+        line_width_min_pixels=3, pickable=True, tooltip_html="<b>Zufahrtsroute</b>",
+        filled=False, stroked=True # Lines aren't filled
+    ),
+    "setup_waiting_areas_preview": dict(
+        fill_color=(0, 123, 255, 160), line_color=(0, 123, 255, 255), # Blueish
+        pickable=True, tooltip_html="<b>Wartebereich</b>"
+    ),
+    "setup_map_bounds_preview": dict(
+        fill_color=(108, 117, 125, 40), line_color=(108, 117, 125, 200), # Light grey
+        line_width_min_pixels=2, pickable=True, tooltip_html="<b>Kartenanzeigegrenzen</b>"
+    ),
+}
+
 # --- End PyDeck Map Helper Functions ---
 
+@st.cache_data(ttl=60, max_entries=128, show_spinner=False)
+def check_project_name(name):
+    '''Asks the backend whether a project name is taken. Cached briefly so reruns with an unchanged
+    name don't repeat the request; failures raise and are therefore not cached.'''
+    response = get_api_session().get(f"{API_URL}/api/projects/check_name/{name}", timeout=1.0)
+    return response.json() if response.ok else {"exists": None}
+
 def show_project_setup():
     """Show the project setup page"""
     # Set widget width for project setup
@@ -63,407 +104,501 @@ def show_project_setup():
         )
         st.session_state.project_setup_map_initialized = True
     
-    tab1, tab2, tab3 = st.tabs([
-        "1. Projektdetails & Zählstellen", 
-        "2. Aktivitätsdatei hochladen", 
-        "3. GeoJSON-Daten hochladen"
-    ])
+    # Only the active step is executed; st.tabs would run all three bodies on every rerun
+    step = st.radio(
+        "Schritt",
+        options=list(SETUP_STEPS),
+        horizontal=True,
+        key="setup_step",
+        label_visibility="collapsed",
+    )
+    SETUP_STEPS[step]()
+
+
+def _show_details_step():
+    '''Step 1: project name, delivery times and counting stations'''
+    st.subheader("Projektname definieren")
+    project_name = st.text_input("Projektname", value=st.session_state.get("project_name", ""), key="project_name_input", help="Drücken Sie Enter oder klicken Sie weg, um den Projektnamen festzulegen")
     
-    with tab1:
-        st.subheader("Projektname definieren")
-        project_name = st.text_input("Projektname", value=st.session_state.get("project_name", ""), key="project_name_input", help="Drücken Sie Enter oder klicken Sie weg, um den Projektnamen festzulegen")
-        
-        if project_name and project_name != st.session_state.get("project_name", ""):
-            try:
-                response = requests.get(f"{API_URL}/api/projects/check_name/{project_name}")
-                if response.status_code == 200 and response.json().get("exists", False):
-                    st.error(f"Ein Projekt mit dem Namen '{project_name}' existiert bereits. Bitte wählen Sie einen anderen Namen.")
-                    st.session_state.project_name_valid = False
-                else:
-                    st.success(f"Projektname '{project_name}' ist verfügbar!")
-                    st.session_state.project_name = project_name
-                    st.session_state.project_name_valid = True
-            except Exception as e:
-                st.warning(f"Eindeutigkeit des Projektnamens konnte nicht überprüft werden: {e}. Gehe davon aus, dass er verfügbar ist.")
+    if project_name and project_name != st.session_state.get("project_name", ""):
+        try:
+            if check_project_name(project_name).get("exists", False):
+                st.error(f"Ein Projekt mit dem Namen '{project_name}' existiert bereits. Bitte wählen Sie einen anderen Namen.")
+                st.session_state.project_name_valid = False
+            else:
+                st.success(f"Projektname '{project_name}' ist verfügbar!")
                 st.session_state.project_name = project_name
-                st.session_state.project_name_valid = True # Proceed with caution
-        elif not project_name:
-             st.session_state.project_name_valid = False # Clear validity if name is cleared
+                st.session_state.project_name_valid = True
+        except Exception as e:
+            st.warning(f"Eindeutigkeit des Projektnamens konnte nicht überprüft werden: {e}. Gehe davon aus, dass er verfügbar ist.")
+            st.session_state.project_name = project_name
+            st.session_state.project_name_valid = True # Proceed with caution
+    elif not project_name:
+         st.session_state.project_name_valid = False # Clear validity if name is cleared
+    
+    if st.session_state.get("project_name_valid", False):
+        st.markdown("---")
+        st.subheader("Liefertage und -zeiten")
+
+        if not st.session_state.get("project_name_valid", False):
+            st.info("Projektname noch nicht validiert – Sie können trotzdem schon Tage/Zeiten wählen; sie werden gespeichert, sobald der Name bestätigt ist.")
+
+        weekdays = ["Montag", "Dienstag", "Mittwoch", "Donnerstag", "Freitag", "Samstag"]
+        selected_days = st.multiselect(
+            "Liefertage",
+            options=weekdays,
+            default=st.session_state.get("delivery_days", weekdays[:-1]),
+            key="delivery_days_multiselect",
+        )
+        st.session_state.delivery_days = selected_days
+
+        # Time inputs with more space between them
+        st.markdown("<div style='display: flex; justify-content: space-between; margin-bottom: 10px;'>", unsafe_allow_html=True)
         
-        if st.session_state.get("project_name_valid", False):
-            st.markdown("---")
-            st.subheader("Liefertage und -zeiten")
-
-            if not st.session_state.get("project_name_valid", False):
-                st.info("Projektname noch nicht validiert – Sie können trotzdem schon Tage/Zeiten wählen; sie werden gespeichert, sobald der Name bestätigt ist.")
-
-            weekdays = ["Montag", "Dienstag", "Mittwoch", "Donnerstag", "Freitag", "Samstag"]
-            selected_days = st.multiselect(
-                "Liefertage",
-                options=weekdays,
-                default=st.session_state.get("delivery_days", weekdays[:-1]),
-                key="delivery_days_multiselect",
-            )
-            st.session_state.delivery_days = selected_days
+        # First column - Delivery from
+        st.markdown("<div style='width: 48%;'>", unsafe_allow_html=True)
+        st.markdown("<small><b>Lieferung von</b></small>", unsafe_allow_html=True)
+        default_start_time = st.session_state.get("delivery_hours", {}).get("start", time(7, 0))
+        start_time = st.time_input(
+            label="",
+            value=default_start_time,
+            key="delivery_start_time_input",
+            label_visibility="collapsed",
+        )
+        st.markdown("</div>", unsafe_allow_html=True)
+        
+        # Second column - Delivery until  
+        st.markdown("<div style='width: 48%;'>", unsafe_allow_html=True)
+        st.markdown("<small><b>Lieferung bis</b></small>", unsafe_allow_html=True)
+        default_end_time = st.session_state.get("delivery_hours", {}).get("end", time(17, 0))
+        end_time = st.time_input(
+            label="",
+            value=default_end_time,
+            key="delivery_end_time_input",
+            label_visibility="collapsed",
+        )
+        st.markdown("</div>", unsafe_allow_html=True)
+        
+        st.markdown("</div>", unsafe_allow_html=True)
 
-            # Time inputs with more space between them
-            st.markdown("<div style='display: flex; justify-content: space-between; margin-bottom: 10px;'>", unsafe_allow_html=True)
-            
-            # First column - Delivery from
-            st.markdown("<div style='width: 48%;'>", unsafe_allow_html=True)
-            st.markdown("<small><b>Lieferung von</b></small>", unsafe_allow_html=True)
-            default_start_time = st.session_state.get("delivery_hours", {}).get("start", time(7, 0))
-            start_time = st.time_input(
-                label="",
-                value=default_start_time,
-                key="delivery_start_time_input",
-                label_visibility="collapsed",
-            )
-            st.markdown("</div>", unsafe_allow_html=True)
+        st.session_state.delivery_hours = {"start": start_time, "end": end_time}
+
+        # Guard: only enable further sections/actions once project_name is validated
+        if not st.session_state.get("project_name_valid", False):
+            st.info("Validieren Sie den Projektnamen oben, um mit Zählstellen und Uploads fortzufahren.")
+            st.stop()
+
+        st.markdown("---")
+        st.subheader("Verkehrszählstellen")
+        with st.expander("ℹ️ Info zu Zählstellen"):
+            st.markdown("Wählen Sie relevante Verkehrszählstellen aus. Daten von diesen Stationen werden für die Verkehrsanalyse verwendet. [Stationen auf Zürich Stadtplan anzeigen](https://www.stadtplan.stadt-zuerich.ch/zueriplan3/stadtplan.aspx#route_visible=true&basemap=Basiskarte+(Geb%C3%A4udeschr%C3%A4gansicht)&map=&scale=8000&xkoord=2680153.2835917696&ykoord=1248850.403632357&lang=&layer=Z%C3%A4hlstelle+MIV%3A%3A0&window=&selectedObject=&selectedLayer=&toggleScreen=&legacyUrlState=&drawings=)")
+
+        @st.cache_data(ttl=3600, max_entries=1, show_spinner=False)
+        def load_counting_stations_data(): # Renamed to avoid conflict if other pages use similar names
+            try:
+                counters_file = "data/prepared/counters.csv"
+                if not os.path.exists(counters_file): return []
+                df = pd.read_csv(counters_file, usecols=lambda c: c in STATION_COLUMNS,
+                                 dtype={'counter_id': 'category', 'direction': 'category', 'display_name': 'category',
+                                        'name': 'string', 'coordinates': 'string'})
+                # Default [lat, lon] for every row, overwritten positionally from the masked columns below
+                latlon = np.tile(np.array(DEFAULT_STATION_COORDS), (len(df), 1))
+                if 'lat' in df.columns and 'lon' in df.columns:
+                    raw_latlon = df[['lat', 'lon']].to_numpy(dtype=float)
+                    valid = ~np.isnan(raw_latlon).any(axis=1)
+                    latlon[valid] = raw_latlon[valid]
+                coords = latlon.tolist()
+                # A parseable 'coordinates' value takes precedence; each string is decoded exactly once
+                if 'coordinates' in df.columns:
+                    raw_coords = df['coordinates'].dropna()
+                    for i, raw in zip(df.index.get_indexer(raw_coords.index).tolist(), raw_coords.tolist()):
+                        try: coords[i] = json.loads(raw)
+                        except ValueError: coords[i] = list(DEFAULT_STATION_COORDS)
+                return [
+                    {'id': counter_id, 'name': name, 'direction': direction, 'display_name': display_name, 'coordinates': c}
+                    for counter_id, name, direction, display_name, c in zip(
+                        df['counter_id'].tolist(), df['name'].tolist(), df['direction'].tolist(),
+                        df['display_name'].tolist(), coords)
+                ]
+            except Exception: return []
+        
+        counting_stations = load_counting_stations_data()
+        
+        if counting_stations:
+            if "selected_counters" not in st.session_state: st.session_state.selected_counters = []
+            if "primary_counter" not in st.session_state: st.session_state.primary_counter = None
             
-            # Second column - Delivery until  
-            st.markdown("<div style='width: 48%;'>", unsafe_allow_html=True)
-            st.markdown("<small><b>Lieferung bis</b></small>", unsafe_allow_html=True)
-            default_end_time = st.session_state.get("delivery_hours", {}).get("end", time(17, 0))
-            end_time = st.time_input(
-                label="",
-                value=default_end_time,
-                key="delivery_end_time_input",
-                label_visibility="collapsed",
-            )
-            st.markdown("</div>", unsafe_allow_html=True)
+            # Display counters on the map (optional)
+            # This could be an enhancement - adding counter markers to the background map
+            st.info("Die Auswahl der Zählstellen erfolgt über Dropdown-Menüs. Stationen können auch auf der Karte angezeigt werden.")
+
+            # Lookups by display name and by (id, direction), built once per run
+            station_options = {s['display_name']: s for s in counting_stations}
+            stations_by_key = {(s['id'], s['direction']): s for s in counting_stations}
+            station_names = tuple(station_options)
+            name_to_idx = {name: i for i, name in enumerate(station_names)}
+            primary_station_disp_name = st.selectbox("Primäre Zählstation", options=station_names,
+                                                   index=name_to_idx.get(st.session_state.primary_counter['display_name'], 0) if st.session_state.primary_counter else 0)
+            if primary_station_disp_name:
+                st.session_state.primary_counter = station_options[primary_station_disp_name]
+
+            primary = st.session_state.primary_counter
+            primary_key = (primary['id'], primary['direction']) if primary else None
+            secondary_opts_dict = {s['display_name']: s for key, s in stations_by_key.items() if key != primary_key}
             
-            st.markdown("</div>", unsafe_allow_html=True)
-
-            st.session_state.delivery_hours = {"start": start_time, "end": end_time}
-
-            # Guard: only enable further sections/actions once project_name is validated
-            if not st.session_state.get("project_name_valid", False):
-                st.info("Validieren Sie den Projektnamen oben, um mit Zählstellen und Uploads fortzufahren.")
-                st.stop()
-
-            st.markdown("---")
-            st.subheader("Verkehrszählstellen")
-            with st.expander("ℹ️ Info zu Zählstellen"):
-                st.markdown("Wählen Sie relevante Verkehrszählstellen aus. Daten von diesen Stationen werden für die Verkehrsanalyse verwendet. [Stationen auf Zürich Stadtplan anzeigen](https://www.stadtplan.stadt-zuerich.ch/zueriplan3/stadtplan.aspx#route_visible=true&basemap=Basiskarte+(Geb%C3%A4udeschr%C3%A4gansicht)&map=&scale=8000&xkoord=2680153.2835917696&ykoord=1248850.403632357&lang=&layer=Z%C3%A4hlstelle+MIV%3A%3A0&window=&selectedObject=&selectedLayer=&toggleScreen=&legacyUrlState=&drawings=)")
-
-            @st.cache_data(ttl=3600)
-            def load_counting_stations_data(): # Renamed to avoid conflict if other pages use similar names
-                try:
-                    counters_file = "data/prepared/counters.csv"
-                    if not os.path.exists(counters_file): return []
-                    df = pd.read_csv(counters_file)
-                    stations = []
-                    for _, row in df.iterrows():
-                        coords = [47.3769, 8.5417] # Default
-                        if 'coordinates' in df.columns and not pd.isna(row['coordinates']):
-                            try: coords = json.loads(row['coordinates'])
-                            except: pass
-                        elif 'lat' in df.columns and 'lon' in df.columns and not pd.isna(row['lat']) and not pd.isna(row['lon']):
-                            coords = [float(row['lat']), float(row['lon'])]
-                        stations.append({
-                            'id': row['counter_id'], 'name': row['name'], 'direction': row['direction'],
-                            'display_name': row['display_name'], 'coordinates': coords }) # Store as [lat,lon]
-                    return stations
-                except Exception: return []
+            # Previously selected secondaries (primary excluded; all of them if no primary is set yet)
+            current_secondary_disp_names = [
+                s['display_name'] for s in st.session_state.selected_counters
+                if (s['id'], s['direction']) != primary_key and s['display_name'] in secondary_opts_dict
+            ]
+
+            secondary_station_disp_names = st.multiselect("Sekundäre Zählstationen (bis zu 3)", options=list(secondary_opts_dict.keys()), default=current_secondary_disp_names, max_selections=3)
             
-            counting_stations = load_counting_stations_data()
+            temp_selected_counters = []
+            if primary: temp_selected_counters.append(primary)
+            for name in secondary_station_disp_names:
+                if name in secondary_opts_dict: temp_selected_counters.append(secondary_opts_dict[name])
+            st.session_state.selected_counters = temp_selected_counters
             
-            if counting_stations:
-                if "selected_counters" not in st.session_state: st.session_state.selected_counters = []
-                if "primary_counter" not in st.session_state: st.session_state.primary_counter = None
-                
-                # Display counters on the map (optional)
-                # This could be an enhancement - adding counter markers to the background map
-                st.info("Die Auswahl der Zählstellen erfolgt über Dropdown-Menüs. Stationen können auch auf der Karte angezeigt werden.")
+            # Load and display traffic profile preview (no map involved here)
+            if st.session_state.selected_counters:
+                all_profiles = load_traffic_profiles()
+                # Parse all not-yet-loaded selections concurrently instead of one by one in the loop below
+                all_profiles.preload(f"{c['id']}_{c['direction']}" for c in st.session_state.selected_counters)
+                # Local to the preview: st.session_state.counter_profiles belongs to the dashboard, which expects loaded data
+                preview_profiles = {}
+                unreadable_profiles = []
+                for counter in st.session_state.selected_counters:
+                    profile_id = f"{counter['id']}_{counter['direction']}"
+                    if profile_id in all_profiles:
+                        try:
+                            profile_name = all_profiles[profile_id]['name']
+                        except PROFILE_READ_ERRORS:
+                            unreadable_profiles.append(counter['display_name'])
+                            continue
+                        # Metadata only; the DataFrames stay in the shared loader cache
+                        preview_profiles[profile_id] = {
+                            'id': counter['id'],
+                            'direction': counter['direction'],
+                            'name': profile_name,
+                            'is_primary': (counter['id'], counter['direction']) == primary_key
+                        }
+                if unreadable_profiles:
+                    st.warning(f"Profildaten konnten nicht gelesen werden: {', '.join(unreadable_profiles)}")
+
+                if preview_profiles:
+                    st.markdown("---")
+                    st.subheader("Verkehrsprofil-Vorschau")
+                    col_day, col_month = st.columns(2)
+                    with col_day:
+                        selected_weekday = st.selectbox("Wochentag", options=list(WEEKDAYS_DE_TO_EN), key="profile_preview_weekday")
+                    with col_month:
+                        selected_month = st.selectbox("Monat", options=range(1, 13), format_func=lambda m: MONTHS_DE[m - 1],
+                                                      index=date.today().month - 1, key="profile_preview_month")
+                    english_weekday = WEEKDAYS_DE_TO_EN[selected_weekday]
+                    start_hour = st.session_state.delivery_hours["start"].hour
+                    end_hour = st.session_state.delivery_hours["end"].hour
+                    hours = range(start_hour, end_hour + 1)
+
+                    # One .xs() slice per station on the (weekday, month, hour) index, joined column-wise
+                    station_columns = {}
+                    for profile_id, profile in preview_profiles.items():
+                        station_name = f"{PRIMARY_MARKER} {profile['name']}" if profile['is_primary'] else profile['name']
+                        try:
+                            day_slice = all_profiles[profile_id]['data'].xs((english_weekday, selected_month), level=('weekday', 'month'))
+                        except (KeyError, ValueError):
+                            continue # No rows for this weekday/month
+                        station_columns[station_name] = day_slice['vehicles'].astype("float64")
+                    if station_columns:
+                        preview_df = pd.DataFrame(station_columns).reindex(hours).round().astype("Int64")
+                        preview_df.index = HOUR_LABELS[start_hour:end_hour + 1]
+                        preview_df.index.name = "Stunde"
+                        st.dataframe(preview_df, use_container_width=True)
+                        st.caption(f"Durchschnittliche Fahrzeuge pro Stunde (exkl. Feiertage). {PRIMARY_MARKER} = primäre Zählstation")
+                    else:
+                        st.info("Für diese Auswahl sind keine Profildaten vorhanden.")
+        else:
+            st.error("Zählstellendaten nicht verfügbar. Bitte überprüfen Sie 'data/prepared/counters.csv'.")
+    else:
+        st.info("Bitte geben Sie einen gültigen und verfügbaren Projektnamen ein, um fortzufahren.")
+
+
+def _show_activity_upload_step():
+    '''Step 2: upload and validate the activity file'''
+    st.subheader("Bauaktivitätsdatei hochladen")
+    if not st.session_state.get("project_name_valid", False):
+        st.info("Bitte definieren Sie einen Projektnamen im ersten Schritt.")
+    else:
+        # ... (Keep existing file upload logic for CSV/Excel, validation, and preview) ...
+        # This part should remain as is, since it's about data processing, not map display.
+        st.markdown("Wenn Sie eine Excel- oder CSV-Datei mit den Spalten: `Vorgangsname`, `Anfangstermin`, `Endtermin`, `Material` haben, laden Sie sie hier hoch.")
+        if "truck_divisor" not in st.session_state: st.session_state.truck_divisor = 20
+        divisor = st.number_input("Materialmenge pro LKW", value=st.session_state.truck_divisor, min_value=1)
+        st.session_state.truck_divisor = divisor
+        uploaded_file = st.file_uploader("Aktivitätsdatei hochladen", type=["csv", "xlsx"], key="activity_file_uploader")
+        if uploaded_file:
+            try:
+                # Basic validation (example)
+                required_cols = ["vorgangsname", "anfangstermin", "endtermin", "material"]
+                # Parse only the required columns (pandas' openpyxl reader already opens workbooks read-only)
+                is_required_col = lambda c: str(c).lower().strip() in required_cols
+                # getvalue() returns the upload buffer without re-reading it; project creation calls it again
+                file_bytes = uploaded_file.getvalue()
+                df = pd.read_excel(BytesIO(file_bytes), engine="openpyxl", usecols=is_required_col) if uploaded_file.name.endswith('xlsx') \
+                    else pd.read_csv(BytesIO(file_bytes), usecols=is_required_col)
+                df_cols_lower = [col.lower().strip() for col in df.columns]
+                # Create mapping
+                col_mapping = {actual_col: req_col for req_col in required_cols for actual_col in df.columns if actual_col.lower().strip() == req_col}
+                missing_cols = [rc for rc in required_cols if rc not in col_mapping.values()]
 
-                station_options = {s['display_name']: s for s in counting_stations}
-                primary_station_disp_name = st.selectbox("Primäre Zählstation", options=list(station_options.keys()), 
-                                                       index=list(station_options.keys()).index(st.session_state.primary_counter['display_name']) if st.session_state.primary_counter else 0)
-                if primary_station_disp_name:
-                    st.session_state.primary_counter = station_options[primary_station_disp_name]
+                if missing_cols:
+                    st.error(f"Fehlende erforderliche Spalten: {', '.join(missing_cols)}. Bitte stellen Sie sicher, dass Ihre Datei folgende Spalten hat: Vorgangsname, Anfangstermin, Endtermin, Material.")
+                else:
+                    df_std = df.rename(columns=col_mapping)
+                    df_std['anfangstermin'] = pd.to_datetime(df_std['anfangstermin'])
+                    df_std['endtermin'] = pd.to_datetime(df_std['endtermin'])
+                    df_std['material'] = pd.to_numeric(df_std['material'])
+                    # Whole trucks; nullable Int32 so empty material cells stay missing instead of failing the cast
+                    df_std['anzahl_lastwagen'] = pd.Series(
+                        np.ceil(df_std['material'].to_numpy(dtype=np.float64) / divisor), index=df_std.index
+                    ).astype("Int32")
+                    st.dataframe(df_std.head())
+                    st.session_state.processed_df = df_std # Store for final creation step
+                    st.session_state.excel_file = uploaded_file # Store original file object for API
+                    st.success("Datei erfolgreich verarbeitet.")
+            except Exception as e:
+                st.error(f"Fehler beim Verarbeiten der Datei: {e}")
+        elif st.session_state.get("excel_file") and st.session_state.get("processed_df") is not None:
+            # The uploader loses its file while another step is shown; the parsed result is kept in session state
+            st.success(f"Datei '{st.session_state.excel_file.name}' bereits verarbeitet. Eine neue Datei ersetzt sie.")
+            st.dataframe(st.session_state.processed_df.head())
 
-                secondary_opts_dict = {name: data for name, data in station_options.items() if not (st.session_state.primary_counter and data['id'] == st.session_state.primary_counter['id'] and data['direction'] == st.session_state.primary_counter['direction'])}
+
+def _show_geojson_upload_step():
+    '''Step 3: upload the GeoJSON layers and create the project'''
+    st.subheader("GeoJSON-Daten hochladen")
+    if not st.session_state.get("project_name_valid", False) or not st.session_state.get("excel_file"):
+        st.info("Bitte vervollständigen Sie Projektname und Aktivitätsdatei-Upload in den vorherigen Schritten.")
+    else:
+        st.markdown("Laden Sie GeoJSON-Dateien hoch für: Baustelle (Polygon), Zufahrtsroute(n) (LineString/MultiLineString), Wartebereiche (Polygon/MultiPolygon) und Kartengrenzen (Polygon).")
+        
+        construction_site_file = st.file_uploader("Baustelle GeoJSON", type=["json", "geojson"], key="geojson_site")
+        routes_file = st.file_uploader("Zufahrtsroute(n) GeoJSON", type=["json", "geojson"], key="geojson_routes")
+        waiting_areas_file = st.file_uploader("Wartebereiche GeoJSON", type=["json", "geojson"], key="geojson_waiting")
+        map_bounds_file = st.file_uploader("Kartengrenzen GeoJSON", type=["json", "geojson"], key="geojson_bounds")
+
+        # The uploaders lose their files while another step is shown; earlier uploads are kept in session state
+        stored_uploads = [
+            label for label, state_key, upload in (
+                ("Baustelle", "polygon", construction_site_file), ("Zufahrtsroute(n)", "access_routes", routes_file),
+                ("Wartebereiche", "waiting_areas", waiting_areas_file), ("Kartengrenzen", "map_bounds", map_bounds_file),
+            ) if upload is None and st.session_state.get(state_key)
+        ]
+        if stored_uploads:
+            st.info(f"Bereits geladen: {', '.join(stored_uploads)}. Eine neue Datei ersetzt die gespeicherte.")
+
+        # Parse all present uploads concurrently; each block below picks up its own result or error
+        geojson_futures = submit_geojson_uploads({
+            "site": construction_site_file, "routes": routes_file,
+            "waiting": waiting_areas_file, "bounds": map_bounds_file,
+        })
+
+        # Process and temporarily store uploaded GeoJSON data
+        # When construction_site_file is uploaded, update map view and layer
+        if construction_site_file:
+            try:
+                # The upload as-is is stored for project creation; the map only gets the simplified preview
+                site_upload, site_geojson_data = geojson_futures["site"].result()
+                st.session_state.polygon = site_upload # Store for project creation
                 
-                current_secondary_disp_names = []
-                if st.session_state.selected_counters and st.session_state.primary_counter:
-                    current_secondary_disp_names = [
-                        s['display_name'] for s in st.session_state.selected_counters 
-                        if not (s['id'] == st.session_state.primary_counter['id'] and s['direction'] == st.session_state.primary_counter['direction'])
-                    ]
-                elif st.session_state.selected_counters: # if no primary counter yet, all selected are secondary for this selection step
-                    current_secondary_disp_names = [s['display_name'] for s in st.session_state.selected_counters]
-
-                secondary_station_disp_names = st.multiselect("Sekundäre Zählstationen (bis zu 3)", options=list(secondary_opts_dict.keys()), default=current_secondary_disp_names, max_selections=3)
+                # Update map view to zoom to the construction site with animation
+                # Ensure the geometry is correctly passed for bounds calculation
+                site_geom_dict = None
+                if site_geojson_data.get("type") == "Polygon":
+                    site_geom_dict = site_geojson_data
+                elif site_geojson_data.get("type") == "Feature" and site_geojson_data.get("geometry", {}).get("type") == "Polygon":
+                    site_geom_dict = site_geojson_data["geometry"]
+                elif site_geojson_data.get("type") == "FeatureCollection" and site_geojson_data.get("features"): # Take first polygon feature
+                    first_poly_feature = next((f for f in site_geojson_data["features"] if f.get("geometry",{}).get("type")=="Polygon"), None)
+                    if first_poly_feature:
+                        site_geom_dict = first_poly_feature["geometry"]
+                if site_geom_dict:
+                    try:
+                        site_geom = shape(site_geom_dict)
+                    except (TypeError, ValueError, IndexError, AttributeError, GEOSException):
+                        site_geom = None
+                    # Invalid or empty geometry has no usable bounds (NaN); the helper falls back to the default view
+                    update_map_view_to_bounds(site_geom.bounds if site_geom is not None and not site_geom.is_empty else None)
                 
-                temp_selected_counters = []
-                if st.session_state.primary_counter: temp_selected_counters.append(st.session_state.primary_counter)
-                for name in secondary_station_disp_names:
-                    if name in secondary_opts_dict: temp_selected_counters.append(secondary_opts_dict[name])
-                st.session_state.selected_counters = temp_selected_counters
+                # Add construction site layer to the map
+                site_feature = create_geojson_feature(site_geojson_data, {"name": "Construction Site Preview"})
+                st.session_state.map_layers = [create_pydeck_geojson_layer(
+                    data=[site_feature],
+                    layer_id="setup_construction_site_preview",
+                    **PREVIEW_LAYER_STYLES["setup_construction_site_preview"]
+                )]
+                st.success("Baustellen-GeoJSON geladen und Karte aktualisiert.")
+            except Exception as e:
+                st.error(f"Fehler beim Verarbeiten der Baustellen-GeoJSON: {e}")
+                st.session_state.map_layers = [] # Clear layers on error
+        
+        if routes_file: 
+            try:
+                routes_upload, routes_geojson = geojson_futures["routes"].result()
+                st.session_state.access_routes = routes_upload
                 
-                # Load and display traffic profile preview (no map involved here)
-                if st.session_state.selected_counters:
-                    # ... (traffic profile loading and preview table logic - keep as is, it's not map related) ...
-                    # This part is complex and not directly related to the map, so keeping it for now.
-                    # Ensure load_traffic_profiles and the preview table generation are still functional.
-                    pass # Placeholder for existing profile preview logic
-            else:
-                st.error("Zählstellendaten nicht verfügbar. Bitte überprüfen Sie 'data/prepared/counters.csv'.")
-        else:
-            st.info("Bitte geben Sie einen gültigen und verfügbaren Projektnamen ein, um fortzufahren.")
-
-    with tab2: # Upload File
-        st.subheader("Bauaktivitätsdatei hochladen")
-        if not st.session_state.get("project_name_valid", False):
-            st.info("Bitte definieren Sie einen Projektnamen im ersten Schritt.")
-        else:
-            # ... (Keep existing file upload logic for CSV/Excel, validation, and preview) ...
-            # This part should remain as is, since it's about data processing, not map display.
-            st.markdown("Wenn Sie eine Excel- oder CSV-Datei mit den Spalten: `Vorgangsname`, `Anfangstermin`, `Endtermin`, `Material` haben, laden Sie sie hier hoch.")
-            if "truck_divisor" not in st.session_state: st.session_state.truck_divisor = 20
-            divisor = st.number_input("Materialmenge pro LKW", value=st.session_state.truck_divisor, min_value=1)
-            st.session_state.truck_divisor = divisor
-            uploaded_file = st.file_uploader("Aktivitätsdatei hochladen", type=["csv", "xlsx"], key="activity_file_uploader")
-            if uploaded_file:
-                try:
-                    df = pd.read_excel(uploaded_file) if uploaded_file.name.endswith('xlsx') else pd.read_csv(uploaded_file)
-                    uploaded_file.seek(0) # Reset for potential re-read by API call
-                    # Basic validation (example)
-                    required_cols = ["vorgangsname", "anfangstermin", "endtermin", "material"]
-                    df_cols_lower = [col.lower().strip() for col in df.columns]
-                    # Create mapping
-                    col_mapping = {actual_col: req_col for req_col in required_cols for actual_col in df.columns if actual_col.lower().strip() == req_col}
-                    missing_cols = [rc for rc in required_cols if rc not in col_mapping.values()]
-
-                    if missing_cols:
-                        st.error(f"Fehlende erforderliche Spalten: {', '.join(missing_cols)}. Bitte stellen Sie sicher, dass Ihre Datei folgende Spalten hat: Vorgangsname, Anfangstermin, Endtermin, Material.")
-                    else:
-                        df_std = df.rename(columns=col_mapping)
-                        df_std['anfangstermin'] = pd.to_datetime(df_std['anfangstermin'])
-                        df_std['endtermin'] = pd.to_datetime(df_std['endtermin'])
-                        df_std['material'] = pd.to_numeric(df_std['material'])
-                        df_std['anzahl_lastwagen'] = np.ceil(df_std['material'] / divisor)
-                        st.dataframe(df_std.head())
-                        st.session_state.processed_df = df_std # Store for final creation step
-                        st.session_state.excel_file = uploaded_file # Store original file object for API
-                        st.success("Datei erfolgreich verarbeitet.")
-                except Exception as e:
-                    st.error(f"Fehler beim Verarbeiten der Datei: {e}")
-
-    with tab3: # Upload GeoJSON
-        st.subheader("GeoJSON-Daten hochladen")
-        if not st.session_state.get("project_name_valid", False) or not st.session_state.get("excel_file"):
-            st.info("Bitte vervollständigen Sie Projektname und Aktivitätsdatei-Upload in den vorherigen Schritten.")
-        else:
-            st.markdown("Laden Sie GeoJSON-Dateien hoch für: Baustelle (Polygon), Zufahrtsroute(n) (LineString/MultiLineString), Wartebereiche (Polygon/MultiPolygon) und Kartengrenzen (Polygon).")
-            
-            construction_site_file = st.file_uploader("Baustelle GeoJSON", type=["json", "geojson"], key="geojson_site")
-            routes_file = st.file_uploader("Zufahrtsroute(n) GeoJSON", type=["json", "geojson"], key="geojson_routes")
-            waiting_areas_file = st.file_uploader("Wartebereiche GeoJSON", type=["json", "geojson"], key="geojson_waiting")
-            map_bounds_file = st.file_uploader("Kartengrenzen GeoJSON", type=["json", "geojson"], key="geojson_bounds")
-
-            # Process and temporarily store uploaded GeoJSON data
-            # When construction_site_file is uploaded, update map view and layer
-            if construction_site_file:
-                try:
-                    site_geojson_data = json.load(construction_site_file)
-                    construction_site_file.seek(0) # Reset for potential re-read by API
-                    st.session_state.polygon = site_geojson_data # Store for project creation
+                # Add to map layers if construction site is already loaded
+                if hasattr(st.session_state, 'map_layers') and st.session_state.map_layers:
+                    routes_features = []
                     
-                    # Update map view to zoom to the construction site with animation
-                    # Ensure the geometry is correctly passed for bounds calculation
-                    if site_geojson_data.get("type") == "Polygon":
-                        update_map_view_to_project_bounds(site_geojson_data) 
-                    elif site_geojson_data.get("type") == "Feature" and site_geojson_data.get("geometry", {}).get("type") == "Polygon":
-                        update_map_view_to_project_bounds(site_geojson_data["geometry"]) 
-                    elif site_geojson_data.get("type") == "FeatureCollection" and site_geojson_data.get("features"): # Take first polygon feature
-                        first_poly_feature = next((f for f in site_geojson_data["features"] if f.get("geometry",{}).get("type")=="Polygon"), None)
-                        if first_poly_feature:
-                            update_map_view_to_project_bounds(first_poly_feature["geometry"])
+                    # Handle different GeoJSON structures
+                    if routes_geojson.get("type") == "FeatureCollection":
+                        routes_features = [create_geojson_feature(f.get("geometry"), f.get("properties"), allowed_keys=PREVIEW_FEATURE_KEYS) for f in routes_geojson.get("features", [])]
+                    elif routes_geojson.get("type") == "Feature":
+                        routes_features = [create_geojson_feature(routes_geojson.get("geometry"), routes_geojson.get("properties"), allowed_keys=PREVIEW_FEATURE_KEYS)]
+                    elif routes_geojson.get("type") in ["LineString", "MultiLineString"]:
+                        routes_features = [create_geojson_feature(routes_geojson, {"name": "Access Route"})]
+                    elif isinstance(routes_geojson, list):
+                        # Assuming it's a list of LineString features or geometries
+                        for route in routes_geojson:
+                            if route.get("type") == "Feature":
+                                routes_features.append(create_geojson_feature(route.get("geometry"), route.get("properties"), allowed_keys=PREVIEW_FEATURE_KEYS))
+                            elif route.get("type") in ["LineString", "MultiLineString"]:
+                                routes_features.append(create_geojson_feature(route, {"name": "Access Route"}))
                     
-                    # Add construction site layer to the map
-                    site_feature = create_geojson_feature(site_geojson_data, {"name": "Construction Site Preview"})
-                    st.session_state.map_layers = [create_pydeck_geojson_layer(
-                        data=[site_feature],
-                        layer_id="setup_construction_site_preview",
-                        fill_color=[220, 53, 69, 160], # Reddish
-                        line_color=[220, 53, 69, 255],
-                        pickable=True, 
-                        tooltip_html="<b>{properties.name}</b>"
-                    )]
-                    st.success("Baustellen-GeoJSON geladen und Karte aktualisiert.")
-                except Exception as e:
-                    st.error(f"Fehler beim Verarbeiten der Baustellen-GeoJSON: {e}")
-                    st.session_state.map_layers = [] # Clear layers on error
-            
-            if routes_file: 
-                try:
-                    routes_geojson = json.load(routes_file)
-                    routes_file.seek(0)
-                    st.session_state.access_routes = routes_geojson
-                    
-                    # Add to map layers if construction site is already loaded
-                    if hasattr(st.session_state, 'map_layers') and st.session_state.map_layers:
-                        routes_features = []
-                        
-                        # Handle different GeoJSON structures
-                        if routes_geojson.get("type") == "FeatureCollection":
-                            routes_features = routes_geojson.get("features", [])
-                        elif routes_geojson.get("type") == "Feature":
-                            routes_features = [routes_geojson]
-                        elif routes_geojson.get("type") in ["LineString", "MultiLineString"]:
-                            routes_features = [create_geojson_feature(routes_geojson, {"name": "Access Route"})]
-                        elif isinstance(routes_geojson, list):
-                            # Assuming it's a list of LineString features or geometries
-                            for route in routes_geojson:
-                                if route.get("type") == "Feature":
-                                    routes_features.append(route)
-                                elif route.get("type") in ["LineString", "MultiLineString"]:
-                                    routes_features.append(create_geojson_feature(route, {"name": "Access Route"}))
-                        
-                        if routes_features:
-                            routes_layer = create_pydeck_geojson_layer(
-                                data=routes_features,
-                                layer_id="setup_access_routes_preview",
-                                fill_color=[40, 167, 69, 160], # Greenish
-                                line_color=[40, 167, 69, 255],
-                                line_width_min_pixels=3,
-                                pickable=True,
-                                tooltip_html="<b>Zufahrtsroute</b>",
-                                filled=False, # Lines aren't filled
-                                stroked=True
-                            )
-                            # Add to existing layers
-                            st.session_state.map_layers.append(routes_layer)
-                            st.success("Zufahrtsrouten zur Kartenvorschau hinzugefügt.")
-                except Exception as e:
-                    st.error(f"Fehler beim Verarbeiten der Zufahrtsrouten-GeoJSON: {e}")
-            
-            if waiting_areas_file: 
-                try:
-                    waiting_geojson = json.load(waiting_areas_file)
-                    waiting_areas_file.seek(0)
-                    st.session_state.waiting_areas = waiting_geojson
+                    if routes_features:
+                        routes_layer = create_pydeck_geojson_layer(
+                            data=routes_features,
+                            layer_id="setup_access_routes_preview",
+                            **PREVIEW_LAYER_STYLES["setup_access_routes_preview"]
+                        )
+                        # Add to existing layers
+                        st.session_state.map_layers.append(routes_layer)
+                        st.success("Zufahrtsrouten zur Kartenvorschau hinzugefügt.")
+            except Exception as e:
+                st.error(f"Fehler beim Verarbeiten der Zufahrtsrouten-GeoJSON: {e}")
+        
+        if waiting_areas_file: 
+            try:
+                waiting_upload, waiting_geojson = geojson_futures["waiting"].result()
+                st.session_state.waiting_areas = waiting_upload
+                
+                # Add to map layers if construction site is already loaded
+                if hasattr(st.session_state, 'map_layers') and st.session_state.map_layers:
+                    waiting_features = []
                     
-                    # Add to map layers if construction site is already loaded
-                    if hasattr(st.session_state, 'map_layers') and st.session_state.map_layers:
-                        waiting_features = []
-                        
-                        # Handle different GeoJSON structures
-                        if waiting_geojson.get("type") == "FeatureCollection":
-                            waiting_features = waiting_geojson.get("features", [])
-                        elif waiting_geojson.get("type") == "Feature":
-                            waiting_features = [waiting_geojson]
-                        elif waiting_geojson.get("type") in ["Polygon", "MultiPolygon"]:
-                            waiting_features = [create_geojson_feature(waiting_geojson, {"name": "Waiting Area"})]
-                        elif isinstance(waiting_geojson, list):
-                            # Assuming it's a list of Polygon features or geometries
-                            for area in waiting_geojson:
-                                if area.get("type") == "Feature":
-                                    waiting_features.append(area)
-                                elif area.get("type") in ["Polygon", "MultiPolygon"]:
-                                    waiting_features.append(create_geojson_feature(area, {"name": "Waiting Area"}))
-                        
-                        if waiting_features:
-                            waiting_layer = create_pydeck_geojson_layer(
-                                data=waiting_features,
-                                layer_id="setup_waiting_areas_preview",
-                                fill_color=[0, 123, 255, 160], # Blueish
-                                line_color=[0, 123, 255, 255],
-                                pickable=True,
-                                tooltip_html="<b>Wartebereich</b>"
-                            )
-                            # Add to existing layers
-                            st.session_state.map_layers.append(waiting_layer)
-                            st.success("Wartebereiche zur Kartenvorschau hinzugefügt.")
-                except Exception as e:
-                    st.error(f"Fehler beim Verarbeiten der Wartebereiche-GeoJSON: {e}")
-            
-            if map_bounds_file: 
-                try:
-                    bounds_geojson = json.load(map_bounds_file)
-                    map_bounds_file.seek(0)
-                    st.session_state.map_bounds = bounds_geojson
+                    # Handle different GeoJSON structures
+                    if waiting_geojson.get("type") == "FeatureCollection":
+                        waiting_features = [create_geojson_feature(f.get("geometry"), f.get("properties"), allowed_keys=PREVIEW_FEATURE_KEYS) for f in waiting_geojson.get("features", [])]
+                    elif waiting_geojson.get("type") == "Feature":
+                        waiting_features = [create_geojson_feature(waiting_geojson.get("geometry"), waiting_geojson.get("properties"), allowed_keys=PREVIEW_FEATURE_KEYS)]
+                    elif waiting_geojson.get("type") in ["Polygon", "MultiPolygon"]:
+                        waiting_features = [create_geojson_feature(waiting_geojson, {"name": "Waiting Area"})]
+                    elif isinstance(waiting_geojson, list):
+                        # Assuming it's a list of Polygon features or geometries
+                        for area in waiting_geojson:
+                            if area.get("type") == "Feature":
+                                waiting_features.append(create_geojson_feature(area.get("geometry"), area.get("properties"), allowed_keys=PREVIEW_FEATURE_KEYS))
+                            elif area.get("type") in ["Polygon", "MultiPolygon"]:
+                                waiting_features.append(create_geojson_feature(area, {"name": "Waiting Area"}))
                     
-                    # Add to map layers if construction site is already loaded
-                    if hasattr(st.session_state, 'map_layers') and st.session_state.map_layers:
-                        bounds_features = []
-                        
-                        # Handle different GeoJSON structures
-                        if bounds_geojson.get("type") == "FeatureCollection":
-                            bounds_features = bounds_geojson.get("features", [])
-                        elif bounds_geojson.get("type") == "Feature":
-                            bounds_features = [bounds_geojson]
-                        elif bounds_geojson.get("type") == "Polygon":
-                            bounds_features = [create_geojson_feature(bounds_geojson, {"name": "Map Bounds"})]
-                        
-                        if bounds_features:
-                            bounds_layer = create_pydeck_geojson_layer(
-                                data=bounds_features,
-                                layer_id="setup_map_bounds_preview",
-                                fill_color=[108, 117, 125, 40], # Light grey
-                                line_color=[108, 117, 125, 200],
-                                pickable=True,
-                                line_width_min_pixels=2,
-                                tooltip_html="<b>Kartenanzeigegrenzen</b>"
-                            )
-                            # Add to existing layers
-                            st.session_state.map_layers.append(bounds_layer)
-                            st.success("Kartengrenzen zur Vorschau hinzugefügt.")
-                except Exception as e:
-                    st.error(f"Fehler beim Verarbeiten der Kartengrenzen-GeoJSON: {e}")
+                    if waiting_features:
+                        waiting_layer = create_pydeck_geojson_layer(
+                            data=waiting_features,
+                            layer_id="setup_waiting_areas_preview",
+                            **PREVIEW_LAYER_STYLES["setup_waiting_areas_preview"]
+                        )
+                        # Add to existing layers
+                        st.session_state.map_layers.append(waiting_layer)
+                        st.success("Wartebereiche zur Kartenvorschau hinzugefügt.")
+            except Exception as e:
+                st.error(f"Fehler beim Verarbeiten der Wartebereiche-GeoJSON: {e}")
+        
+        if map_bounds_file: 
+            try:
+                bounds_upload, bounds_geojson = geojson_futures["bounds"].result()
+                st.session_state.map_bounds = bounds_upload
                 
-            all_setup_files_loaded = all([
-                st.session_state.get("project_name_valid"),
-                st.session_state.get("excel_file"),
-                st.session_state.get("polygon"), 
-                st.session_state.get("access_routes"),
-                st.session_state.get("waiting_areas"),
-                st.session_state.get("map_bounds")
-            ])
-
-            if all_setup_files_loaded:
-                if st.button("Projekt erstellen", key="create_project_button"):
-                    create_project_from_session_state() # Call a helper to finalize
-            else:
-                st.warning("Bitte laden Sie alle erforderlichen GeoJSON-Dateien hoch und stellen Sie sicher, dass die vorherigen Schritte vollständig sind.")
+                # Add to map layers if construction site is already loaded
+                if hasattr(st.session_state, 'map_layers') and st.session_state.map_layers:
+                    bounds_features = []
+                    
+                    # Handle different GeoJSON structures
+                    if bounds_geojson.get("type") == "FeatureCollection":
+                        bounds_features = bounds_geojson.get("features", [])
+                    elif bounds_geojson.get("type") == "Feature":
+                        bounds_features = [bounds_geojson]
+                    elif bounds_geojson.get("type") == "Polygon":
+                        bounds_features = [create_geojson_feature(bounds_geojson, {"name": "Map Bounds"})]
+                    
+                    if bounds_features:
+                        bounds_layer = create_pydeck_geojson_layer(
+                            data=bounds_features,
+                            layer_id="setup_map_bounds_preview",
+                            **PREVIEW_LAYER_STYLES["setup_map_bounds_preview"]
+                        )
+                        # Add to existing layers
+                        st.session_state.map_layers.append(bounds_layer)
+                        st.success("Kartengrenzen zur Vorschau hinzugefügt.")
+            except Exception as e:
+                st.error(f"Fehler beim Verarbeiten der Kartengrenzen-GeoJSON: {e}")
+            
+        all_setup_files_loaded = all([
+            st.session_state.get("project_name_valid"),
+            st.session_state.get("excel_file"),
+            st.session_state.get("polygon"), 
+            st.session_state.get("access_routes"),
+            st.session_state.get("waiting_areas"),
+            st.session_state.get("map_bounds")
+        ])
+
+        if all_setup_files_loaded:
+            if st.button("Projekt erstellen", key="create_project_button"):
+                create_project_from_session_state() # Call a helper to finalize
+        else:
+            st.warning("Bitte laden Sie alle erforderlichen GeoJSON-Dateien hoch und stellen Sie sicher, dass die vorherigen Schritte vollständig sind.")
+
+
+# Setup steps in display order, mapped to their render functions
+SETUP_STEPS = {
+    "1. Projektdetails & Zählstellen": _show_details_step,
+    "2. Aktivitätsdatei hochladen": _show_activity_upload_step,
+    "3. GeoJSON-Daten hochladen": _show_geojson_upload_step,
+}
+
+
+def clean_counter(counter):
+    '''Returns the backend form of a selected counter: text fields without surrounding quotes plus its profile_id.
+    Coordinates are passed through unchanged ([lat, lon] as stored).'''
+    counter_id = str(counter['id']).strip('"\'')
+    direction = str(counter['direction']).strip('"\'')
+    return {
+        "id": counter_id,
+        "name": str(counter['name']).strip('"\''),
+        "direction": direction,
+        "profile_id": f"{counter_id}_{direction}",
+        "display_name": str(counter['display_name']).strip('"\''),
+        "coordinates": counter.get('coordinates', [0, 0]),
+    }
+
+# Compact JSON for the multipart form fields: no whitespace between tokens, and the session
+# state structures are plain trees, so the circular-reference check is skipped
+encode_form_json = json.JSONEncoder(separators=(",", ":"), check_circular=False).encode
+
+# Setup-specific session state keys, cleared once a project has been created
+SETUP_SESSION_KEYS = frozenset((
+    "excel_file", "project_name", "project_name_valid", "polygon", "waiting_areas", 
+    "access_routes", "map_bounds", "selected_counters", "truck_divisor",
+    "primary_counter", "delivery_days", "delivery_hours", "processed_df",
+    "project_setup_map_initialized", "counter_profiles", "setup_step"
+))
 
 # Helper for project creation (moved from original create_project for clarity)
 def create_project_from_session_state():
     try:
         # Prepare counter data (ensure it's cleaned as per original logic)
-        selected_counters_clean = []
-        if "selected_counters" in st.session_state:
-            for counter in st.session_state.selected_counters:
-                # Make sure coordinates are in [lat, lon] if not already for backend
-                # Backend might expect specific format, ensure this matches
-                coords = counter.get('coordinates', [0,0]) # Default coords
-                id_clean = str(counter['id']).strip('"\'')
-                dir_clean = str(counter['direction']).strip('"\'')
-                selected_counters_clean.append({
-                    "id": id_clean,
-                    "name": str(counter['name']).strip('"\''),
-                    "direction": dir_clean,
-                    "profile_id": f"{id_clean}_{dir_clean}",
-                    "display_name": str(counter['display_name']).strip('"\''),
-                    "coordinates": coords,
-                })
-        
-        primary_counter_clean = None
-        if "primary_counter" in st.session_state and st.session_state.primary_counter:
-            pc = st.session_state.primary_counter
-            coords_pc = pc.get('coordinates', [0,0])
-            pc_id_clean = str(pc['id']).strip('"\'')
-            pc_dir_clean = str(pc['direction']).strip('"\'')
-            primary_counter_clean = {
-                "id": pc_id_clean,
-                "name": str(pc['name']).strip('"\''),
-                "direction": pc_dir_clean,
-                "profile_id": f"{pc_id_clean}_{pc_dir_clean}",
-                "display_name": str(pc['display_name']).strip('"\''),
-                "coordinates": coords_pc,
-            }
+        selected_counters_clean = [clean_counter(counter) for counter in st.session_state.get("selected_counters", [])]
+        primary_counter_clean = clean_counter(st.session_state.primary_counter) if st.session_state.get("primary_counter") else None
         
         delivery_hours_send = {}
         if "delivery_hours" in st.session_state and st.session_state.delivery_hours:
@@ -473,95 +608,178 @@ def create_project_from_session_state():
 
         form_data = {
             "name": st.session_state.project_name,
-            "polygon": json.dumps(st.session_state.polygon),
-            "waiting_areas": json.dumps(st.session_state.waiting_areas),
-            "access_routes": json.dumps(st.session_state.access_routes),
-            "map_bounds": json.dumps(st.session_state.map_bounds),
-            "primary_counter": json.dumps(primary_counter_clean) if primary_counter_clean else None,
-            "selected_counters": json.dumps(selected_counters_clean) if selected_counters_clean else None,
-            "delivery_days": json.dumps(st.session_state.get("delivery_days", [])),
-            "delivery_hours": json.dumps(delivery_hours_send) 
+            "polygon": encode_form_json(st.session_state.polygon),
+            "waiting_areas": encode_form_json(st.session_state.waiting_areas),
+            "access_routes": encode_form_json(st.session_state.access_routes),
+            "map_bounds": encode_form_json(st.session_state.map_bounds),
+            "primary_counter": encode_form_json(primary_counter_clean) if primary_counter_clean else None,
+            "selected_counters": encode_form_json(selected_counters_clean) if selected_counters_clean else None,
+            "delivery_days": encode_form_json(st.session_state.get("delivery_days", [])),
+            "delivery_hours": encode_form_json(delivery_hours_send) 
         }
         
         file_obj = st.session_state.excel_file
-        file_obj.seek(0)
         content_type = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet" if file_obj.name.endswith("xlsx") else "text/csv"
         files = {"file": (file_obj.name, file_obj.getvalue(), content_type)}
         
-        response = requests.post(f"{API_URL}/api/projects/", data=form_data, files=files)
+        response = get_api_session().post(f"{API_URL}/api/projects/", data=form_data, files=files)
         
-        if response.status_code == 200:
-            project_data = response.json()
-            st.success(f"Projekt '{project_data['name']}' erfolgreich erstellt!")
-            st.session_state.current_project = project_data
-            st.session_state.page = "admin" # Navigate to admin page for the new project
-            st.session_state.projects = [] # Force refresh of project list from sidebar
-            st.session_state.initial_load = False # Force project list reload
-            
-            # Clear setup-specific session state keys
-            keys_to_clear_from_setup = [
-                "excel_file", "project_name", "project_name_valid", "polygon", "waiting_areas", 
-                "access_routes", "map_bounds", "selected_counters", "truck_divisor",
-                "primary_counter", "delivery_days", "delivery_hours", "processed_df",
-                "project_setup_map_initialized"
-            ]
-            if 'counter_profiles' in st.session_state: keys_to_clear_from_setup.append('counter_profiles')
-            for key in keys_to_clear_from_setup:
-                if key in st.session_state: del st.session_state[key]
-            st.rerun()
-        else:
+        if response.status_code != 200:
             st.error(f"Projekt konnte nicht erstellt werden: {response.status_code} - {response.text}")
-    except Exception as e:
+            return
+        project_data = response.json()
+        project_name = project_data['name']
+    except (requests.RequestException, KeyError, TypeError, ValueError) as e:
         st.error(f"Fehler beim Erstellen des Projekts: {str(e)}")
         import traceback
         st.error(f"Traceback: {traceback.format_exc()}")
+        return
 
-# Helper functions for GeoJSON layers
-def create_geojson_feature(geometry, properties=None):
-    '''Wraps a GeoJSON geometry into a GeoJSON Feature structure.'''
-    if properties is None: properties = {}
-    return {"type": "Feature", "geometry": geometry, "properties": properties}
-
-def create_pydeck_geojson_layer(
-    data, layer_id, fill_color=[255, 255, 255, 100], line_color=[0, 0, 0, 200],
-    line_width_min_pixels=1, get_line_width=10, opacity=0.5, stroked=True, filled=True,
-    extruded=False, wireframe=True, pickable=False, tooltip_html=None, auto_highlight=True,
-    highlight_color=[0, 0, 128, 128]
-):
-    '''Creates a PyDeck GeoJsonLayer with specified parameters.'''
-    layer_config = {
-        "id": layer_id, "data": data, "opacity": opacity, "stroked": stroked, "filled": filled,
-        "extruded": extruded, "wireframe": wireframe, "get_fill_color": fill_color,
-        "get_line_color": line_color, "get_line_width": get_line_width,
-        "line_width_min_pixels": line_width_min_pixels, "pickable": pickable,
-        "auto_highlight": auto_highlight, "highlight_color": highlight_color
-    }
-    if tooltip_html and pickable: layer_config["tooltip"] = {"html": tooltip_html}
-    return pdk.Layer("GeoJsonLayer", **layer_config)
+    st.success(f"Projekt '{project_name}' erfolgreich erstellt!")
+    st.session_state.current_project = project_data
+    st.session_state.page = "admin" # Navigate to admin page for the new project
+    st.session_state.projects = [] # Force refresh of project list from sidebar
+    st.session_state.initial_load = False # Force project list reload
+    
+    # Clear setup-specific session state keys
+    # One set intersection picks the present keys instead of probing the session proxy per key
+    for key in SETUP_SESSION_KEYS.intersection(st.session_state.keys()):
+        del st.session_state[key]
+    st.rerun()
 
 # Keep load_traffic_profiles and other helper functions if they are used by the profile preview section
-@st.cache_data(ttl=3600)
+# Only these _metadata.csv columns are used; all are read as plain strings (no type inference)
+PROFILE_META_COLUMNS = ['profile_id', 'file', 'counter_id', 'direction', 'display_name']
+
+PROFILES_PARQUET = "data/prepared/profiles.parquet"
+# Errors of a missing, unreadable or malformed profile CSV (pyarrow.ArrowInvalid is a ValueError)
+PROFILE_READ_ERRORS = (OSError, KeyError, ValueError, pa.ArrowInvalid)
+PROFILE_INDEX = ['weekday', 'month', 'hour']
+# Narrow dtypes for profile CSVs (int8/float32/categorical instead of int64/float64/object),
+# roughly a quarter of the default memory per profile. Arrow's CSV reader only builds
+# dictionary columns with int32 indices.
+PROFILE_COLUMN_TYPES = {
+    'hour': pa.int8(), 'month': pa.int8(), 'vehicles': pa.float32(),
+    'weekday': pa.dictionary(pa.int32(), pa.string()),
+    'weekday_de': pa.dictionary(pa.int32(), pa.string()),
+    'month_name': pa.dictionary(pa.int32(), pa.string())
+}
+
+# The CSV parser releases the GIL, so profile files are read on a shared thread pool
+# (module-level so cache invalidations don't spin up new threads).
+_PROFILE_READ_EXECUTOR = ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 1) + 4))
+
+def _existing_files(paths):
+    '''Returns the subset of paths that exist, using one os.scandir per directory instead of a stat per file.'''
+    paths_by_dir = {}
+    for path in paths:
+        if path: paths_by_dir.setdefault(os.path.dirname(path), []).append(path)
+    existing = set()
+    for dirname, dir_paths in paths_by_dir.items():
+        try:
+            with os.scandir(dirname or ".") as entries:
+                names = {entry.name for entry in entries if entry.is_file()}
+        except OSError:
+            continue
+        existing.update(path for path in dir_paths if os.path.basename(path) in names)
+    return existing
+
+def _read_profile_task(task):
+    profile_key, row, profile_file_path = task
+    profile_data_df = pacsv.read_csv(
+        profile_file_path, convert_options=pacsv.ConvertOptions(column_types=PROFILE_COLUMN_TYPES)
+    ).to_pandas()
+    # Sorted (weekday, month, hour) index: lookups are .loc/.xs instead of boolean masks over all rows
+    return profile_key, row, profile_data_df.set_index(PROFILE_INDEX).sort_index()
+
+class _LazyProfiles(Mapping):
+    '''Read-only mapping profile_id -> profile dict whose DataFrame is parsed on first access.
+
+    Listing keys only needs _metadata.csv; a profile file is read the first time its
+    entry is looked up and memoized for every later lookup (and every session).'''
+
+    def __init__(self, tasks):
+        self._tasks = {task[0]: task for task in tasks}
+        self._loaded = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, profile_key):
+        profile = self._loaded.get(profile_key)
+        if profile is None:
+            profile = self._store(*_read_profile_task(self._tasks[profile_key]))
+        return profile
+
+    def __contains__(self, profile_key):
+        # Membership only needs the metadata; Mapping's default would parse the profile via __getitem__
+        return profile_key in self._tasks
+
+    def __iter__(self):
+        return iter(self._tasks)
+
+    def __len__(self):
+        return len(self._tasks)
+
+    def preload(self, profile_keys):
+        '''Parses the given profiles concurrently on the shared thread pool.
+        Unreadable profiles stay unloaded; looking them up raises their error again.'''
+        pending = [self._tasks[k] for k in profile_keys if k in self._tasks and k not in self._loaded]
+        for future in [_PROFILE_READ_EXECUTOR.submit(_read_profile_task, task) for task in pending]:
+            try:
+                self._store(*future.result())
+            except PROFILE_READ_ERRORS:
+                pass
+
+    def _store(self, profile_key, row, profile_data_df):
+        counter_id, direction, display_name = row
+        with self._lock:
+            return self._loaded.setdefault(profile_key, {
+                'id': counter_id, 
+                'direction': direction, 
+                'name': display_name, 
+                'is_primary': False, 
+                'data': profile_data_df
+            })
+
+# cache_resource hands out the same object on every rerun instead of a deep copy, which also
+# lets parsed profiles accumulate in _LazyProfiles. Callers must treat the returned dicts and
+# DataFrames as read-only (use .copy() before mutating).
+@st.cache_resource(ttl=3600, max_entries=1)
 def load_traffic_profiles(): # Example of a function that might be kept
-    profiles = {}
+    tasks = []
     try:
         meta_file = "data/prepared/profiles/_metadata.csv"
         if not os.path.exists(meta_file):
             # st.error(f"Metadaten-Datei {meta_file} nicht gefunden.") # Avoid st calls in cached func if possible
-            return {}
-        meta_df = pd.read_csv(meta_file)
-        for _, row in meta_df.iterrows():
-            profile_key = row['profile_id'] 
-            profile_file_path = row['file']
-            if os.path.exists(profile_file_path):
-                profile_data_df = pd.read_csv(profile_file_path)
-                profiles[profile_key] = {
-                    'id': str(row['counter_id']).strip('\"\''), 
-                    'direction': str(row['direction']).strip('\"\''), 
-                    'name': str(row['display_name']).strip('\"\''), 
-                    'is_primary': False, 
-                    'data': profile_data_df
-                }
+            return _LazyProfiles([])
+        meta_tbl = pacsv.read_csv(meta_file, convert_options=pacsv.ConvertOptions(
+            include_columns=PROFILE_META_COLUMNS,
+            column_types={col: pa.string() for col in PROFILE_META_COLUMNS}
+        ))
+        stripped = {col: pc.utf8_trim(meta_tbl.column(col), characters='\"\'').to_pylist()
+                    for col in ('counter_id', 'direction', 'display_name')}
+        profile_files = meta_tbl.column('file').to_pylist()
+        existing_files = _existing_files(profile_files)
+        tasks = [
+            (profile_key, (counter_id, direction, display_name), profile_file_path)
+            for profile_key, profile_file_path, counter_id, direction, display_name in zip(
+                meta_tbl.column('profile_id').to_pylist(), profile_files,
+                stripped['counter_id'], stripped['direction'], stripped['display_name']
+            )
+            if profile_file_path in existing_files
+        ]
     except Exception as e:
         # print(f"Error loading traffic profiles: {e}") # Use print for errors in cached funcs
         pass # Or handle error appropriately
-    return profiles 
\ No newline at end of file
+    profiles = _LazyProfiles(tasks)
+    # Prefer the combined profiles.parquet written by src/prepare_profiles.py: one read for all profiles
+    if tasks and os.path.exists(PROFILES_PARQUET) and os.path.getmtime(PROFILES_PARQUET) >= os.path.getmtime(meta_file):
+        try:
+            all_df = pd.read_parquet(PROFILES_PARQUET, engine="pyarrow", columns=['profile_id', *PROFILE_INDEX, 'vehicles'])
+            rows = {task[0]: task[1] for task in tasks}
+            for profile_key, group in all_df.groupby('profile_id', sort=False, observed=True):
+                if profile_key in rows:
+                    profiles._store(profile_key, rows[profile_key],
+                                    group.drop(columns=['profile_id']).set_index(PROFILE_INDEX).sort_index())
+        except (OSError, ValueError, KeyError):
+            pass # Fall back to reading the per-profile files on access
+    return profiles
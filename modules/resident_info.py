@@ -1,12 +1,5 @@
 import streamlit as st
-import pandas as pd
-import json
-import requests
-import os
 from datetime import datetime, date, timedelta
-import pydeck as pdk
-import plotly.express as px
-import plotly.graph_objects as go
 import numpy as np
 from utils.map_utils import (
     update_map_view_to_project_bounds,
@@ -14,25 +7,19 @@ from utils.map_utils import (
     create_pydeck_geojson_layer,
     create_pydeck_path_layer,
     create_pydeck_access_route_layer,
+    SITE_COLOR,
+)
+from utils.dashoboard_utils import (
+    get_week_options, SEGMENT_COLORS, SEGMENT_WIDTH, congestion_classes,
 )
-from utils.dashoboard_utils import build_segments_for_hour, build_hourly_layer_cache, render_hourly_traffic_component, get_week_options, get_days_in_week
 from utils.custom_styles import apply_chart_styling
-import streamlit.components.v1 as components
 import modules.dashboard as _dash
-from config import API_URL  # Import centralized config
+from config import API_URL, get_api_session  # Import centralized config
 
 # API_URL is now imported from config.py
 
-def show_resident_info(project):
-    """Show the resident information page with simplified traffic information"""
-    # Set widget width for resident info
-    st.session_state.widget_width_percent = 35
-    
-    # Apply chart styling for this page
-    apply_chart_styling()
-
-    # Additional mobile friendly tweaks for the floating widget panel
-    st.markdown("""
+# Mobile tweaks for the floating widget panel
+MOBILE_PANEL_CSS = """
     <style>
     @media (max-width: 480px) {
         /* Position widget panel at the bottom on very small screens */
@@ -50,10 +37,27 @@ def show_resident_info(project):
         }
     }
     </style>
-    """, unsafe_allow_html=True)
+    """
+
+# Status card label and background per congestion class (see congestion_classes)
+TRAFFIC_STATUS = (("Wenig Verkehr", "green"), ("Mässiger Verkehr", "orange"), ("Starker Verkehr", "red"))
+
+def show_resident_info(project):
+    """Show the resident information page with simplified traffic information"""
+    # Set widget width for resident info
+    st.session_state.widget_width_percent = 35
     
-    st.markdown(f"<h2 style='text-align: center;'>Baustellenverkehr Informationen</h2>", unsafe_allow_html=True)
-    st.markdown(f"<h3 style='text-align: center;'>{project['name']}</h3>", unsafe_allow_html=True)
+    # Apply chart styling for this page
+    apply_chart_styling()
+
+    # Additional mobile friendly tweaks for the floating widget panel
+    st.markdown(MOBILE_PANEL_CSS, unsafe_allow_html=True)
+    
+    st.markdown(
+        "<h2 style='text-align: center;'>Baustellenverkehr Informationen</h2>"
+        f"<h3 style='text-align: center;'>{project['name']}</h3>",
+        unsafe_allow_html=True
+    )
     
     # Center map view on project bounds
     view_key = f"resident_info_view_set_{project.get('id')}"
@@ -101,21 +105,12 @@ def show_resident_info(project):
     if st.session_state[current_week_key] != selected_week_id:
         st.session_state[current_week_key] = selected_week_id
     
-    # Get delivery days from project
-    delivery_days_names = project.get("delivery_days", ["Montag", "Dienstag", "Mittwoch", "Donnerstag", "Freitag"])
-    days_in_week = get_days_in_week(selected_week_dict["year"], selected_week_dict["week"], delivery_days_names)
-    
-    # Default to today if it's in the list, otherwise first day of the week
-    default_day_index = next((i for i, d in enumerate(days_in_week) if d == today), 0)
-    
     # --- Unified Date Selector -------------------------------------------------
-    # Determine selectable range from project start/end dates (if provided)
-    min_date, max_date = date(2024, 9, 5), date(2025, 10, 30)
-    if "dates" in project:
-        if "start_date" in project["dates"]:
-            min_date = datetime.fromisoformat(project["dates"]["start_date"]).date()
-        if "end_date" in project["dates"]:
-            max_date = datetime.fromisoformat(project["dates"]["end_date"]).date()
+    # Selectable range from project start/end dates and the delivery hours, parsed once per project and session
+    project_dates_key = f"resident_project_dates_{project.get('id', 'default')}"
+    if project_dates_key not in st.session_state:
+        st.session_state[project_dates_key] = parse_project_dates(project)
+    min_date, max_date, start_hour_int, end_hour_int = st.session_state[project_dates_key]
 
     selected_date_for_map = st.date_input(
         "Datum",
@@ -131,19 +126,19 @@ def show_resident_info(project):
     st.markdown("<h3>Tägliche Verkehrslage</h3>", unsafe_allow_html=True)
     
     # ---- Obtain hourly traffic data via dashboard logic ----
-    delivery_hours_cfg = project.get("delivery_hours", {})
-    dh_start = delivery_hours_cfg.get("start", "06:00")
-    dh_end   = delivery_hours_cfg.get("end", "18:00")
-
-    start_hour_int = int(dh_start.split(":")[0]) if ":" in dh_start else 6
-    end_hour_int   = int(dh_end.split(":")[0])   if ":" in dh_end else 18
-
-    available_hours = list(range(start_hour_int, end_hour_int+1))
-
+    # Delivery hours are a contiguous range, so the closest one is the current hour clamped to it
     current_hour = datetime.now().hour
-    closest_hour = min(available_hours, key=lambda x: abs(x - current_hour))
+    closest_hour = min(max(current_hour, start_hour_int), end_hour_int)
 
-    hour_data = _dash.get_traffic_data(selected_date_str, closest_hour, project, base_osm_segments)
+    # Hours are memoized in _cached_traffic, so the status card and the map share one lookup and
+    # slider/date changes back to an already shown hour don't re-simulate it
+    segments_sig = hash(tuple((segment.get("segment_id"), segment.get("length", 0)) for segment in base_osm_segments))
+    with_profiles = bool(st.session_state.get("counter_profiles"))
+    def get_hour_data(date_str, hour_int):
+        return _cached_traffic(date_str, hour_int, project.get("id", "default"), segments_sig, with_profiles,
+                               project, base_osm_segments)
+
+    hour_data = get_hour_data(selected_date_str, closest_hour)
     if not hour_data:
         hour_data = {"traffic_segments": [], "stats": {"total_traffic": 0, "average_congestion": 0, "deliveries_count": 0}}
     
@@ -151,15 +146,7 @@ def show_resident_info(project):
     hour_data["stats"]["average_congestion"] = hour_data["stats"].get("average_congestion", 0)
     congestion_level = hour_data["stats"]["average_congestion"]
     
-    if congestion_level < 0.3:
-        status = "Wenig Verkehr"
-        color = "green"
-    elif congestion_level < 0.7:
-        status = "Mässiger Verkehr"
-        color = "orange"
-    else:
-        status = "Starker Verkehr"
-        color = "red"
+    status, color = TRAFFIC_STATUS[congestion_classes(congestion_level)]
     
     # Show status card
     st.markdown(f"""
@@ -199,10 +186,6 @@ def show_resident_info(project):
             "bearing": 0
         }
     
-    # Helper function to get traffic data for a specific hour
-    def get_hour_data(date_str, hour_int):
-        return _dash.get_traffic_data(date_str, hour_int, project, base_osm_segments)
-    
     # ---- Prepare map layers like dashboard.py ----
     layers_for_pydeck = []
     
@@ -213,8 +196,8 @@ def show_resident_info(project):
         polygon_layer = create_pydeck_geojson_layer(
             data=[polygon_feature], 
             layer_id="resident_project_polygon", 
-            fill_color=[70, 130, 180, 160], 
-            line_color=[70, 130, 180, 160],
+            fill_color=SITE_COLOR,
+            line_color=SITE_COLOR,
             get_line_width=20,
             line_width_min_pixels=2,
             pickable=True, 
@@ -232,49 +215,24 @@ def show_resident_info(project):
             layers_for_pydeck.append(access_route_layer)
     
     # 2. Traffic Segments Layer
-    # Get the traffic data for the selected hour
-    current_traffic_data = get_hour_data(selected_date_str, selected_hour_for_map)
-    
-    if current_traffic_data and "traffic_segments" in current_traffic_data:
-        segments_data = []
-        
-        for segment in current_traffic_data["traffic_segments"]:
-            congestion = segment.get("congestion_level", 0)
-            # Colour depending on congestion
-            if congestion >= 0.7:
-                color = [220, 53, 69, 180]  # Red
-            elif congestion >= 0.3:
-                color = [255, 193, 7, 180]  # Yellow/Orange
-            else:
-                color = [40, 167, 69, 180]  # Green
-            
-            segments_data.append({
-                "path": segment.get("coordinates", []),
-                "name": segment.get("name", "Strasse"),
-                "highway_type": segment.get("highway_type", "Unbekannt"),
-                "traffic_volume": segment.get("traffic_volume", 0),
-                "congestion": congestion,
-                "color": color,
-                # PathLayer width in px – constant width for all routes
-                "width": 8
-            })
-        
-        if segments_data:
-            traffic_layer = create_pydeck_path_layer(
-                data=segments_data,
-                layer_id="resident_traffic_paths",
-                pickable=True,
-                tooltip_html="<b>{name}</b><br/>Volumen: {traffic_volume}<br/>Belastung: {congestion:.2f}"
-            )
-            layers_for_pydeck.append(traffic_layer)
+    # Only rebuilt when the shown date/hour or the segment list changes; otherwise the previous layer
+    # object is reused (the list itself is kept in the entry, so the identity check can't be fooled)
+    traffic_layer_key = f"resident_traffic_layer_{project.get('id', 'default')}"
+    traffic_sig = (selected_date_str, selected_hour_for_map)
+    cached_traffic = st.session_state.get(traffic_layer_key)
+    if cached_traffic is None or cached_traffic[0] != traffic_sig or cached_traffic[1] is not base_osm_segments:
+        traffic_layer = build_traffic_layer(get_hour_data(selected_date_str, selected_hour_for_map))
+        cached_traffic = (traffic_sig, base_osm_segments, traffic_layer)
+        st.session_state[traffic_layer_key] = cached_traffic
+    if cached_traffic[2] is not None:
+        layers_for_pydeck.append(cached_traffic[2])
     
     # Update map layers in session state
     st.session_state.map_layers = layers_for_pydeck
     
-    st.markdown("<div style='margin-bottom: 20px;'></div>", unsafe_allow_html=True)
-
-    # --- Fine-tune just the necessary element spacing ----------------------------------
+    # --- Spacer plus fine-tuning of just the necessary element spacing, in one element ---
     st.markdown("""
+    <div style='margin-bottom: 20px;'></div>
     <style>
         /* Push first metric row a bit downward so it doesn't hug the top edge */
         div[data-testid='stMetric']:first-of-type {
@@ -288,116 +246,153 @@ def show_resident_info(project):
     </style>
     """, unsafe_allow_html=True)
 
+def parse_project_dates(project):
+    """(min_date, max_date, start_hour, end_hour) from the project's dates and delivery hours"""
+    min_date, max_date = date(2024, 9, 5), date(2025, 10, 30)
+    if "dates" in project:
+        if "start_date" in project["dates"]:
+            min_date = datetime.fromisoformat(project["dates"]["start_date"]).date()
+        if "end_date" in project["dates"]:
+            max_date = datetime.fromisoformat(project["dates"]["end_date"]).date()
+
+    delivery_hours_cfg = project.get("delivery_hours", {})
+    dh_start = delivery_hours_cfg.get("start", "06:00")
+    dh_end   = delivery_hours_cfg.get("end", "18:00")
+
+    start_hour_int = int(dh_start.split(":")[0]) if ":" in dh_start else 6
+    end_hour_int   = int(dh_end.split(":")[0])   if ":" in dh_end else 18
+    return min_date, max_date, start_hour_int, end_hour_int
+
+def build_traffic_layer(traffic_data):
+    """PathLayer of the traffic segments of one hour, or None when there are none"""
+    if not traffic_data or "traffic_segments" not in traffic_data:
+        return None
+    traffic_segments = traffic_data["traffic_segments"]
+    congestion_levels = np.array([segment.get("congestion_level", 0) for segment in traffic_segments], dtype=np.float64)
+    # Only the fields used by the path and tooltip go to the browser; width is a layer-wide constant
+    segments_data = [
+        {
+            "path": segment.get("coordinates", []),
+            "name": segment.get("name", "Strasse"),
+            "traffic_volume": segment.get("traffic_volume", 0),
+            "congestion": congestion,
+            "color": SEGMENT_COLORS[color_idx],
+        }
+        for segment, congestion, color_idx in zip(
+            traffic_segments, congestion_levels.tolist(), congestion_classes(congestion_levels).tolist()
+        )
+    ]
+    if not segments_data:
+        return None
+    return create_pydeck_path_layer(
+        data=segments_data,
+        layer_id="resident_traffic_paths",
+        get_width=SEGMENT_WIDTH,
+        width_min_pixels=2,
+        width_max_pixels=10,
+        pickable=True,
+        tooltip_html="<b>{name}</b><br/>Volumen: {traffic_volume}<br/>Belastung: {congestion:.2f}"
+    )
+
+@st.cache_data(ttl=300, max_entries=256, show_spinner=False)
+def _cached_traffic(date_str, hour, project_id, segments_sig, with_profiles, _project, _base_osm_segments):
+    """Traffic data of one hour via the dashboard simulation. The underscore arguments are not hashed;
+    project_id and segments_sig stand in for them, with_profiles keeps profile-less results apart."""
+    return _dash.get_traffic_data(date_str, hour, _project, _base_osm_segments)
+
+@st.cache_data(ttl=300, show_spinner=False)
+def fetch_simulation_results(project_id):
+    """Fetch stored simulation results from the API; None if the project has none yet.
+    Request errors raise, so a transient failure is never cached."""
+    response = get_api_session().get(f"{API_URL}/api/simulation/{project_id}/results", timeout=2)
+    response.raise_for_status()
+    if not response.text or response.text == "null":
+        return None
+    return response.json() or None
+
+@st.cache_data(ttl=300, show_spinner=False)
+def build_synthetic_simulation_data(project_id, today):
+    """Synthetic simulation results for today ±3 days, cached per project and day"""
+    # Draw every random value up front as (day, hour, segment) / (day, hour) arrays
+    rng = np.random.default_rng()
+    days, hours, segment_ids = range(-3, 4), np.arange(6, 19), np.arange(10)
+    shape_dhs, shape_dh = (len(days), len(hours), len(segment_ids)), (len(days), len(hours))
+    segment_factor = segment_ids % 3
+    hour_factor = 1 + 0.2 * (hours - 6) - 0.2 * np.abs(hours - 12)
+    traffic_volume_arr = (50 + rng.integers(0, 100, shape_dhs) * (1 + 0.5 * segment_factor)).astype(int)
+    congestion_level_arr = np.minimum(1.0, 0.2 + rng.random(shape_dhs) * 0.6 * (1 + 0.2 * segment_factor))
+    traffic_volume, congestion_level = traffic_volume_arr.tolist(), congestion_level_arr.tolist()
+    occupied = rng.integers(0, 8, shape_dh).tolist()
+    available = (10 - rng.integers(0, 8, shape_dh)).tolist()
+    total_traffic = (500 + rng.integers(-100, 200, shape_dh) * hour_factor).astype(int).tolist()
+    average_congestion = np.clip(0.3 + rng.random(shape_dh) * 0.4 * hour_factor, 0.1, 0.9).tolist()
+    deliveries_count = (3 + rng.integers(0, 8, shape_dh) * hour_factor).astype(int).tolist()
+
+    # Segment geometry and metadata do not change between hours
+    segment_templates = [
+        {
+            "segment_id": f"segment_{j}",
+            "start_node": f"node_a_{j}",
+            "end_node": f"node_b_{j}",
+            "length": 100 + j * 50,
+            "speed_limit": 50,
+            "coordinates": [
+                # Generate some coordinates that spread out from a center point
+                [8.54 + (j % 3) * 0.005, 47.375 + (j // 3) * 0.005],
+                [8.54 + (j % 3) * 0.005 + 0.002, 47.375 + (j // 3) * 0.005 + 0.002]
+            ],
+            "name": f"Strasse {j}"
+        } for j in range(len(segment_ids))  # 10 road segments
+    ]
+
+    synthetic_data = {}
+    execution_time = datetime.now().isoformat()
+    for d, i in enumerate(days):  # -3 to +3 days
+        date_str = (today + timedelta(days=i)).strftime("%Y-%m-%d")
+        synthetic_data[date_str] = {}
+        
+        # Hourly data for each day (6am to 6pm)
+        for h, hour in enumerate(hours.tolist()):
+            synthetic_data[date_str][hour] = {
+                "id": f"{project_id}_{date_str}_{hour}",
+                "project_id": project_id,
+                "execution_time": execution_time,
+                "traffic_segments": [
+                    {**template, "traffic_volume": volume, "congestion_level": congestion}
+                    for template, volume, congestion in zip(segment_templates, traffic_volume[d][h], congestion_level[d][h])
+                ],
+                "waiting_areas_status": {
+                    "area_0": {
+                        "capacity": 10,
+                        "occupied": occupied[d][h],
+                        "available": available[d][h]
+                    }
+                },
+                "stats": {
+                    "total_traffic": total_traffic[d][h],
+                    "average_congestion": average_congestion[d][h],
+                    "deliveries_count": deliveries_count[d][h],
+                    "construction_phase": "Phase 1"
+                }
+            }
+        
+    return synthetic_data
+
 def get_simulation_data(project_id):
     """Get simulation data for the resident info page"""
     try:
         # Versuchen, echte Daten von der API zu erhalten
-        api_result = None
         try:
-            response = requests.get(
-                f"{API_URL}/api/simulation/{project_id}/results"
-            )
-            
-            if response.status_code == 200 and response.text and response.text != "null":
-                api_result = response.json()
-                if api_result:
-                    return api_result
+            api_result = fetch_simulation_results(project_id)
+            if api_result:
+                return api_result
         except Exception as e:
             print(f"API request failed: {str(e)}")  # Log to console instead of UI
         
         # Wenn API-Anfrage fehlschlägt oder leere Daten zurückgibt, synthetische Daten erzeugen
         st.info("Verwende synthetische Daten für die Visualisierung (API-Daten nicht verfügbar).")
-        synthetic_data = {}
-        
-        # Generate data for the last 7 days and next 7 days
-        today = date.today()
-        
-        for i in range(-3, 4):  # -3 to +3 days
-            current_date = today + timedelta(days=i)
-            date_str = current_date.strftime("%Y-%m-%d")
-            
-            synthetic_data[date_str] = {}
-            
-            # Generate hourly data for each day (6am to 6pm)
-            for hour in range(6, 19):
-                # Create hourly data with random values
-                hourly_data = {
-                    "id": f"{project_id}_{date_str}_{hour}",
-                    "project_id": project_id,
-                    "execution_time": datetime.now().isoformat(),
-                    "traffic_segments": [
-                        {
-                            "segment_id": f"segment_{j}",
-                            "start_node": f"node_a_{j}",
-                            "end_node": f"node_b_{j}",
-                            "length": 100 + j * 50,
-                            "speed_limit": 50,
-                            "traffic_volume": int(50 + np.random.randint(0, 100) * (1 + 0.5 * (j % 3))),
-                            "congestion_level": min(1.0, 0.2 + np.random.random() * 0.6 * (1 + 0.2 * (j % 3))),
-                            "coordinates": [
-                                # Generate some coordinates that spread out from a center point
-                                [8.54 + (j % 3) * 0.005, 47.375 + (j // 3) * 0.005],
-                                [8.54 + (j % 3) * 0.005 + 0.002, 47.375 + (j // 3) * 0.005 + 0.002]
-                            ],
-                            "name": f"Strasse {j}"
-                        } for j in range(10)  # 10 road segments
-                    ],
-                    "waiting_areas_status": {
-                        "area_0": {
-                            "capacity": 10,
-                            "occupied": min(10, int(np.random.randint(0, 8))),
-                            "available": max(0, 10 - int(np.random.randint(0, 8)))
-                        }
-                    },
-                    "stats": {
-                        "total_traffic": int(500 + np.random.randint(-100, 200) * (1 + 0.2 * (hour - 6) - 0.2 * abs(hour - 12))),
-                        "average_congestion": min(0.9, max(0.1, 0.3 + np.random.random() * 0.4 * (1 + 0.2 * (hour - 6) - 0.2 * abs(hour - 12)))),
-                        "deliveries_count": int(3 + np.random.randint(0, 8) * (1 + 0.2 * (hour - 6) - 0.2 * abs(hour - 12))),
-                        "construction_phase": "Phase 1"
-                    }
-                }
-                
-                synthetic_data[date_str][hour] = hourly_data
-        
-        return synthetic_data
+        return build_synthetic_simulation_data(project_id, date.today())
     
     except Exception as e:
         st.error(f"Fehler beim Abrufen der Simulationsdaten: {str(e)}")
         return None
-
-def create_geojson_feature(geometry, properties=None):
-    '''Wraps a GeoJSON geometry into a GeoJSON Feature structure.'''
-    if properties is None: properties = {}
-    return {"type": "Feature", "geometry": geometry, "properties": properties}
-
-def create_pydeck_geojson_layer(
-    data, layer_id, fill_color=[255, 255, 255, 100], line_color=[0, 0, 0, 200],
-    line_width_min_pixels=1, get_line_width=10, opacity=0.5, stroked=True, filled=True,
-    extruded=False, wireframe=True, pickable=False, tooltip_html=None, auto_highlight=True,
-    highlight_color=[0, 0, 128, 128]
-):
-    '''Creates a PyDeck GeoJsonLayer with specified parameters.'''
-    layer_config = {
-        "id": layer_id, "data": data, "opacity": opacity, "stroked": stroked, "filled": filled,
-        "extruded": extruded, "wireframe": wireframe, "get_fill_color": fill_color,
-        "get_line_color": line_color, "get_line_width": get_line_width,
-        "line_width_min_pixels": line_width_min_pixels, "pickable": pickable,
-        "auto_highlight": auto_highlight, "highlight_color": highlight_color
-    }
-    if tooltip_html and pickable: layer_config["tooltip"] = {"html": tooltip_html}
-    return pdk.Layer("GeoJsonLayer", **layer_config)
-
-def create_pydeck_path_layer(
-    data, layer_id, get_path="path", get_color="color", get_width="width",
-    width_scale=1, width_min_pixels=2, width_max_pixels=10, pickable=False, tooltip_html=None,
-    auto_highlight=True, highlight_color=[0,0,128,128]
-):
-    '''Creates a PyDeck PathLayer.'''
-    layer_config = {
-        "id": layer_id, "data": data, "pickable": pickable, "get_path": get_path,
-        "get_color": get_color, "get_width": get_width, "width_scale": width_scale,
-        "width_min_pixels": width_min_pixels, "width_max_pixels": width_max_pixels,
-        "auto_highlight": auto_highlight, "highlight_color": highlight_color
-    }
-    if tooltip_html and pickable: layer_config["tooltip"] = {"html": tooltip_html}
-    return pdk.Layer("PathLayer", **layer_config) 
\ No newline at end of file
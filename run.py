@@ -3,17 +3,16 @@ import sys
 import time
 import webbrowser
 import os
-from threading import Thread
 
 def run_backend():
-    """Run the FastAPI backend server"""
+    """Start the FastAPI backend server and return its process"""
     print("FastAPI Backend wird gestartet...")
-    subprocess.run([sys.executable, "-m", "uvicorn", "app.main:app", "--reload", "--host", "0.0.0.0", "--port", "8000"])
+    return subprocess.Popen([sys.executable, "-m", "uvicorn", "app.main:app", "--reload", "--host", "0.0.0.0", "--port", "8000"])
 
 def run_frontend():
-    """Run the Streamlit frontend"""
+    """Start the Streamlit frontend and return its process"""
     print("Streamlit Frontend wird gestartet...")
-    subprocess.run([sys.executable, "-m", "streamlit", "run", "streamlit_app.py"])
+    return subprocess.Popen([sys.executable, "-m", "streamlit", "run", "streamlit_app.py"])
 
 def open_browser():
     """Open web browser after a short delay"""
@@ -29,33 +28,30 @@ if __name__ == "__main__":
     # Check command line arguments
     if len(sys.argv) > 1:
         if sys.argv[1].lower() == "backend":
-            run_backend()
+            run_backend().wait()
         elif sys.argv[1].lower() == "frontend":
-            run_frontend()
+            run_frontend().wait()
         else:
             print(f"Unbekanntes Argument: {sys.argv[1]}")
             print("Verwendung: python run.py [backend|frontend]")
     else:
-        # Run both in separate threads
-        backend_thread = Thread(target=run_backend)
-        frontend_thread = Thread(target=run_frontend)
-
-        
-        backend_thread.daemon = True
-        frontend_thread.daemon = True
-
-        
+        # Run both as child processes; no threads needed since Popen returns immediately
         print("Baustellenverkehrs-Management-System wird gestartet...")
         
-        backend_thread.start()
+        processes = [run_backend()]
         time.sleep(2)  # Give backend time to start before frontend
-        frontend_thread.start()
+        processes.append(run_frontend())
         
         try:
-            # Keep the script running
-            while True:
+            # Keep the script running while both servers are up
+            while all(proc.poll() is None for proc in processes):
                 time.sleep(1)
         except KeyboardInterrupt:
             print("\nSystem wird heruntergefahren...")
         finally:
-            print("Anwendung gestoppt.") 
\ No newline at end of file
+            for proc in processes:
+                if proc.poll() is None:
+                    proc.terminate()
+            for proc in processes:
+                proc.wait()
+            print("Anwendung gestoppt.")
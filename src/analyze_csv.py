@@ -5,10 +5,49 @@ um Probleme mit dem Einlesen zu identifizieren.
 """
 
 import pandas as pd
+import pyarrow.csv as pacsv
 import csv
+import io
 import os
 import sys
 
+# Für die Analyse genügt der Dateianfang; er wird einmal gelesen und danach nur noch im Speicher ausgewertet
+HEAD_BYTES = 16384
+
+def read_head(input_file, size=HEAD_BYTES):
+    """Liest den Dateianfang und schneidet ihn auf ganze Zeilen zu."""
+    with open(input_file, 'rb') as f:
+        head = f.read(size)
+        complete = len(head) < size
+    text = head.decode('utf-8', errors='replace')
+    if not complete and '\n' in text:
+        text = text[:text.rindex('\n') + 1]
+    return text
+
+def read_sample(text, **kwargs):
+    """Liest die ersten 5 Datenzeilen mit der PyArrow-Engine; fällt auf die C-Engine zurück, wenn
+    PyArrow die Datei oder eine Option (z. B. quoting) ablehnt."""
+    try:
+        return pd.read_csv(io.StringIO(text), engine='pyarrow', dtype_backend='pyarrow', **kwargs).head(5)
+    except Exception:
+        return pd.read_csv(io.StringIO(text), nrows=5, **kwargs)
+
+def profile_file(input_file, sep):
+    """Liest die ganze Datei blockweise mit dem PyArrow-CSV-Reader und zählt Zeilen und leere Werte pro Spalte."""
+    reader = pacsv.open_csv(input_file, parse_options=pacsv.ParseOptions(delimiter=sep))
+    null_counts = [0] * len(reader.schema)
+    rows = 0
+    for batch in reader:
+        rows += batch.num_rows
+        for i, column in enumerate(batch.columns):
+            null_counts[i] += column.null_count
+    return reader.schema, rows, null_counts
+
+def print_columns(df, label="Gefundene Spalten"):
+    print(f"Erfolgreich! {label} ({len(df.columns)}):")
+    for col in df.columns:
+        print(f"  - {col}")
+
 def main():
     # Pfad zur CSV-Datei
     input_file = "data/imports/raw/verkehr_2024.csv"
@@ -24,136 +63,94 @@ def main():
     file_size = os.path.getsize(input_file) / (1024 * 1024)  # in MB
     print(f"Dateigröße: {file_size:.2f} MB")
     
-    # 2. Erste Zeilen direkt lesen
     try:
-        with open(input_file, 'r', encoding='utf-8') as f:
-            print("\nErste 5 Zeilen der Datei:")
-            for i, line in enumerate(f):
-                if i >= 5:
-                    break
-                print(f"Zeile {i+1}: {line.strip()}")
-                if i == 0:  # Header-Zeile
-                    header = line.strip()
-                    print(f"  - Länge: {len(header)} Zeichen")
-                    print(f"  - Anzahl Kommas: {header.count(',')}")
-                    print(f"  - Anzahl Semikolons: {header.count(';')}")
-                    print(f"  - Anzahl Anführungszeichen: {header.count('"')}")
+        head = read_head(input_file)
     except Exception as e:
         print(f"Fehler beim direkten Lesen: {str(e)}")
+        return
+    lines = head.splitlines()
+    header_line = lines[0].strip() if lines else ""
     
-    # 3. Verschiedene Einlesemethoden versuchen
-    print("\nVersuch 1: Standard pandas.read_csv mit Semikolon")
-    try:
-        df = pd.read_csv(input_file, sep=';', nrows=5)
-        print(f"Erfolgreich! Gefundene Spalten ({len(df.columns)}):")
-        for col in df.columns:
-            print(f"  - {col}")
-    except Exception as e:
-        print(f"Fehler: {str(e)}")
+    # 2. Erste Zeilen direkt anzeigen
+    print("\nErste 5 Zeilen der Datei:")
+    for i, line in enumerate(lines[:5]):
+        print(f"Zeile {i+1}: {line.strip()}")
+    quote_count = header_line.count('"')
+    print(f"  - Länge Header: {len(header_line)} Zeichen")
+    print(f"  - Anzahl Kommas: {header_line.count(',')}")
+    print(f"  - Anzahl Semikolons: {header_line.count(';')}")
+    print(f"  - Anzahl Anführungszeichen: {quote_count}")
     
-    print("\nVersuch 2: pandas.read_csv mit Komma")
-    try:
-        df = pd.read_csv(input_file, sep=',', nrows=5)
-        print(f"Erfolgreich! Gefundene Spalten ({len(df.columns)}):")
-        for col in df.columns:
-            print(f"  - {col}")
-    except Exception as e:
-        print(f"Fehler: {str(e)}")
+    # 3. Verschiedene Einlesemethoden auf dem gepufferten Dateianfang versuchen
+    attempts = [
+        ("Versuch 1: Standard pandas.read_csv mit Semikolon", dict(sep=';')),
+        ("Versuch 2: pandas.read_csv mit Komma", dict(sep=',')),
+        ("Versuch 4: pandas.read_csv mit Anführungszeichen-Handling", dict(sep=';', quoting=csv.QUOTE_NONE, escapechar='\\')),
+    ]
+    for label, kwargs in attempts:
+        print(f"\n{label}")
+        try:
+            print_columns(read_sample(head, **kwargs))
+        except Exception as e:
+            print(f"Fehler: {str(e)}")
     
-    print("\nVersuch 3: pandas.read_csv mit Python-Engine")
+    # Versuch 3: Trennzeichen und Quoting in einem Durchgang per csv.Sniffer erkennen
+    print("\nVersuch 3: Automatische Erkennung mit csv.Sniffer")
+    dialect = None
     try:
-        df = pd.read_csv(input_file, sep=None, engine='python', nrows=5)
-        print(f"Erfolgreich! Gefundene Spalten ({len(df.columns)}):")
-        for col in df.columns:
-            print(f"  - {col}")
-    except Exception as e:
-        print(f"Fehler: {str(e)}")
-    
-    print("\nVersuch 4: pandas.read_csv mit Anführungszeichen-Handling")
-    try:
-        df = pd.read_csv(input_file, sep=';', quoting=csv.QUOTE_NONE, nrows=5, escapechar='\\')
-        print(f"Erfolgreich! Gefundene Spalten ({len(df.columns)}):")
-        for col in df.columns:
-            print(f"  - {col}")
+        dialect = csv.Sniffer().sniff(head, delimiters=';,\t|')
+        print(f"Erkanntes Trennzeichen: '{dialect.delimiter}', Anführungszeichen: '{dialect.quotechar}'")
+        print_columns(read_sample(head, sep=dialect.delimiter, quotechar=dialect.quotechar))
     except Exception as e:
         print(f"Fehler: {str(e)}")
     
     # 4. Manuelle Analyse des Headers
     print("\nManuelle Header-Analyse:")
-    try:
-        with open(input_file, 'r', encoding='utf-8') as f:
-            header_line = f.readline().strip()
-            
-            if ',' in header_line and ';' not in header_line:
-                sep = ','
-            elif ';' in header_line and ',' not in header_line:
-                sep = ';'
-            else:
-                comma_count = header_line.count(',')
-                semicolon_count = header_line.count(';')
-                sep = ',' if comma_count > semicolon_count else ';'
-            
-            print(f"Erkanntes Trennzeichen: '{sep}'")
-            
-            if '","' in header_line:
-                # Format: "col1","col2","col3"
-                fields = header_line.split('","')
-                if fields[0].startswith('"'):
-                    fields[0] = fields[0][1:]
-                if fields[-1].endswith('"'):
-                    fields[-1] = fields[-1][:-1]
-                print(f"Erkannt als Format: \"spalte1\",\"spalte2\",...")
-            else:
-                fields = header_line.split(sep)
-                print(f"Erkannt als Format: spalte1{sep}spalte2{sep}...")
-            
-            print(f"Anzahl Felder im Header: {len(fields)}")
-            print("Erste 5 Felder:")
-            for i, field in enumerate(fields[:5]):
-                print(f"  {i+1}. '{field}'")
-    except Exception as e:
-        print(f"Fehler bei Header-Analyse: {str(e)}")
+    if dialect is not None:
+        sep = dialect.delimiter
+    elif ',' in header_line and ';' not in header_line:
+        sep = ','
+    elif ';' in header_line and ',' not in header_line:
+        sep = ';'
+    else:
+        sep = ',' if header_line.count(',') > header_line.count(';') else ';'
+    print(f"Erkanntes Trennzeichen: '{sep}'")
     
-    # 5. Versuch mit manuell bereinigtem Header
+    if '","' in header_line:
+        # Format: "col1","col2","col3"
+        print("Erkannt als Format: \"spalte1\",\"spalte2\",...")
+    else:
+        print(f"Erkannt als Format: spalte1{sep}spalte2{sep}...")
+    
+    # Header bereinigen
+    if header_line.startswith('"') and header_line.endswith('"'):
+        fields = header_line[1:-1].split('","') if '","' in header_line else header_line[1:-1].split(sep)
+    else:
+        fields = header_line.split(sep)
+    clean_fields = [field.strip('"') for field in fields]
+    
+    print(f"Anzahl Felder im Header: {len(clean_fields)}")
+    print("Erste 5 Felder:")
+    for i, field in enumerate(clean_fields[:5]):
+        print(f"  {i+1}. '{field}'")
+    
+    # 5. Versuch mit manuell bereinigtem Header, direkt im Speicher statt über eine temporäre Datei
     print("\nVersuch mit manuell bereinigtem Header:")
     try:
-        with open(input_file, 'r', encoding='utf-8') as f:
-            header_line = f.readline().strip()
-            data_lines = [f.readline() for _ in range(5)]
-        
-        # Header bereinigen
-        if header_line.startswith('"') and header_line.endswith('"'):
-            header_line = header_line[1:-1]
-        
-        if '","' in header_line:
-            fields = header_line.split('","')
-        else:
-            fields = header_line.split(sep)
-        
-        clean_fields = [field.strip('"') for field in fields]
-        print(f"Bereinigte Felder ({len(clean_fields)}):")
-        for i, field in enumerate(clean_fields[:10]):
-            print(f"  {i+1}. '{field}'")
-        
-        # Temporäre Datei mit bereinigtem Header erstellen
-        temp_file = input_file + ".clean"
-        with open(temp_file, 'w', encoding='utf-8') as f:
-            f.write(sep.join(clean_fields) + '\n')
-            for line in data_lines:
-                f.write(line)
-        
-        # Versuche, die bereinigte Datei zu lesen
-        df = pd.read_csv(temp_file, sep=sep, nrows=5)
-        print(f"Erfolgreich! Gefundene Spalten nach Bereinigung ({len(df.columns)}):")
-        for col in df.columns:
-            print(f"  - {col}")
-        
-        # Lösche temporäre Datei
-        os.remove(temp_file)
+        cleaned = sep.join(clean_fields) + '\n' + '\n'.join(lines[1:6]) + '\n'
+        print_columns(read_sample(cleaned, sep=sep), "Gefundene Spalten nach Bereinigung")
     except Exception as e:
         print(f"Fehler bei Bereinigungsversuch: {str(e)}")
-        if os.path.exists(temp_file):
-            os.remove(temp_file)
+    
+    # 6. Profil der ganzen Datei mit dem erkannten Trennzeichen
+    print("\nProfil der ganzen Datei:")
+    try:
+        schema, rows, null_counts = profile_file(input_file, sep)
+        print(f"Zeilen: {rows}")
+        for field, nulls in zip(schema, null_counts):
+            print(f"  - {field.name} ({field.type}): {nulls} leere Werte")
+    except Exception as e:
+        print(f"Fehler beim Profilieren: {str(e)}")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
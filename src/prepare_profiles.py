@@ -1,8 +1,8 @@
 #!/usr/bin/env python3
 """
 Skript zum Vorberechnen von Verkehrsprofilen für verschiedene Wochentage und Monate.
-Die vorberechneten Profile werden als CSV-Dateien gespeichert, um sie schnell
-in der Anwendung laden zu können.
+Die vorberechneten Profile werden als CSV-Dateien und zusätzlich gesammelt als
+eine Parquet-Datei gespeichert, um sie schnell in der Anwendung laden zu können.
 """
 
 import pandas as pd
@@ -42,6 +42,7 @@ def main():
     output_dir = "data/prepared/profiles"
     counters_file = "data/prepared/counters.csv" # Wird jetzt auch hier generiert
     metadata_file = f"{output_dir}/_metadata.csv"
+    profiles_parquet_file = "data/prepared/profiles.parquet" # Alle Profile in einer Datei (Spalte profile_id)
     
     print(f"Vorberechnung der Verkehrsprofile aus {input_file}...")
     start_time = time.time()
@@ -115,8 +116,9 @@ def main():
         df = df.dropna(subset=[fahrzeuge_col])
         
         print("Filtere Daten...")
-        ch_holidays = holidays.CH(prov='ZH', years=2024)
-        df['is_holiday'] = df['date'].apply(lambda x: x in ch_holidays)
+        # Feiertage einmal als datetime64[D]-Array aufbauen und vektorisiert abgleichen
+        ch_holiday_days = np.array(sorted(holidays.CH(prov='ZH', years=2024)), dtype='datetime64[D]')
+        df['is_holiday'] = np.isin(df['datetime'].to_numpy().astype('datetime64[D]'), ch_holiday_days)
         df['is_weekend'] = df['weekday'].isin(['Saturday', 'Sunday'])
         
         data_for_profiles = df[
@@ -181,6 +183,7 @@ def main():
         month_names = {i: datetime(2024, i, 1).strftime('%B') for i in range(1, 13)}
 
         all_profiles_metadata = []
+        all_profile_frames = []
         print(f"Berechne Profile für {len(counters_df)} Zählstellen...")
         successful_counters = 0
 
@@ -209,6 +212,7 @@ def main():
                 
                 output_profile_file = counter_meta_row['file'] # Verwende den Dateipfad aus den Metadaten
                 profile_df.to_csv(output_profile_file, index=False)
+                all_profile_frames.append(profile_df.assign(profile_id=current_profile_id))
                 
                 # Füge nur die relevanten Spalten zu den Metadaten hinzu
                 all_profiles_metadata.append({
@@ -232,6 +236,15 @@ def main():
             # Stelle sicher, dass die Spaltenreihenfolge konsistent ist
             meta_df_final = meta_df_final[['profile_id', 'counter_id', 'direction', 'display_name', 'file', 'lat', 'lon', 'data_points']]
             meta_df_final.to_csv(metadata_file, index=False)
+
+            # Zusätzlich alle Profile als eine Parquet-Datei speichern (ein Lesezugriff in der App)
+            profiles_all_df = pd.concat(all_profile_frames, ignore_index=True)
+            profiles_all_df = profiles_all_df.astype({
+                'profile_id': 'category', 'weekday': 'category', 'weekday_de': 'category',
+                'month_name': 'category', 'month': 'int8', 'hour': 'int8', 'vehicles': 'float32'
+            })
+            profiles_all_df.to_parquet(profiles_parquet_file, engine='pyarrow', compression='zstd', index=False)
+            print(f"Alle Profile gespeichert in: {profiles_parquet_file}")
             
             end_time = time.time()
             duration = end_time - start_time
@@ -1,10 +1,21 @@
 from datetime import date, timedelta, time
 from datetime import datetime
+from functools import lru_cache
 import streamlit as st
 import pydeck as pdk
 import json, textwrap
+import numpy as np
 import streamlit.components.v1 as components
 
+# Congestion thresholds and the matching segment colours (green / yellow-orange / red)
+CONGESTION_THRESHOLDS = (0.3, 0.7)
+SEGMENT_COLORS = ((40, 167, 69, 180), (255, 193, 7, 180), (220, 53, 69, 180))
+SEGMENT_WIDTH = 8 # PathLayer width in px, constant for all routes
+
+def congestion_classes(congestion_levels):
+    """Maps congestion levels in [0, 1] to class indices 0/1/2 (low/moderate/heavy) in one
+    vectorized pass; a level equal to a threshold falls into the higher class."""
+    return np.searchsorted(CONGESTION_THRESHOLDS, congestion_levels, side="right")
 
 def parse_time_from_string(time_input, default_time):
     """Parses a time string (HH:MM) or returns default if input is already a time object or invalid."""
@@ -19,7 +30,12 @@ def parse_time_from_string(time_input, default_time):
 
 def get_week_options():
     """Generates a list of week options for the current and +/- 4 weeks."""
-    today = date.today()
+    # Fresh list and dicts per call, so callers cannot modify the cached options
+    return [dict(option) for option in _week_options_around(date.today())]
+
+@lru_cache(maxsize=4)
+def _week_options_around(today):
+    """Week options around a given day; cached since they only change when the date does."""
     options = []
     for i in range(-8, 9): # Extended range for more flexibility
         dt = today + timedelta(weeks=i)
@@ -35,7 +51,7 @@ def get_week_options():
             "start_date": start_of_week,
             "end_date": end_of_week
         })
-    return options
+    return tuple(options)
 
 def get_week_options_for_year(year: int):
     """Generate ISO-week option dicts for a given calendar year.
@@ -67,6 +83,11 @@ def get_week_options_for_year(year: int):
 
 def get_days_in_week(year, week_num, delivery_days_filter):
     """Gets all dates for a given ISO week number and year, filtered by delivery days."""
+    return list(_days_in_week(year, week_num, tuple(delivery_days_filter)))
+
+@lru_cache(maxsize=128)
+def _days_in_week(year, week_num, delivery_days_filter):
+    """Cached body of get_days_in_week; returns a tuple so callers can't alter the cached dates."""
     # Map German weekday names to ISO weekday numbers (Monday=0, Sunday=6)
     weekday_map_to_iso = {
         "Montag": 0, "Dienstag": 1, "Mittwoch": 2, 
@@ -89,7 +110,7 @@ def get_days_in_week(year, week_num, delivery_days_filter):
         if current_date.year == year and current_date.weekday() in allowed_iso_weekdays:
             days.append(current_date)
         current_date += timedelta(days=1)
-    return days
+    return tuple(days)
 
 def build_segments_for_hour(hour, project, base_osm_segments, date_str, get_traffic_data_func):
     """Return the list of PathLayer-compatible segment dicts for a specific hour.
@@ -114,25 +135,20 @@ def build_segments_for_hour(hour, project, base_osm_segments, date_str, get_traf
     if not traffic_data:
         return segments_data
 
-    for segment in traffic_data.get("traffic_segments", []):
-        congestion = segment.get("congestion_level", 0)
-        # Colour depending on congestion
-        if congestion >= 0.7:
-            color = [220, 53, 69, 180]  # Red
-        elif congestion >= 0.3:
-            color = [255, 193, 7, 180]  # Yellow/Orange
-        else:
-            color = [40, 167, 69, 180]  # Green
-
+    traffic_segments = traffic_data.get("traffic_segments", [])
+    congestion_levels = np.array([segment.get("congestion_level", 0) for segment in traffic_segments], dtype=np.float64)
+    for segment, congestion, color_idx in zip(
+        traffic_segments, congestion_levels.tolist(), congestion_classes(congestion_levels).tolist()
+    ):
         segments_data.append({
             "path": segment.get("coordinates", []),
             "name": segment.get("name", "Strasse"),
             "highway_type": segment.get("highway_type", "Unbekannt"),
             "traffic_volume": segment.get("traffic_volume", 0),
             "congestion": congestion,
-            "color": color,
-            # PathLayer width in px – constant width for all routes
-            "width": 8
+            "color": SEGMENT_COLORS[color_idx],
+            # Read per row by the JS slider component's PathLayer
+            "width": SEGMENT_WIDTH
         })
 
     return segments_data
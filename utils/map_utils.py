@@ -1,5 +1,11 @@
+import json
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import streamlit as st
 import pydeck as pdk
+from shapely.errors import GEOSException
+from shapely.geometry import mapping, shape
 
 def update_map_view_to_project_bounds(project_map_bounds):
     '''Helper function to update st.session_state.map_view_state to fit project_map_bounds.'''
@@ -16,10 +22,16 @@ def update_map_view_to_project_bounds(project_map_bounds):
         )
         return
     try:
-        min_lon = min(p[0] for p in bounds_coords_list)
-        max_lon = max(p[0] for p in bounds_coords_list)
-        min_lat = min(p[1] for p in bounds_coords_list)
-        max_lat = max(p[1] for p in bounds_coords_list)
+        # GEOS computes the envelope in C instead of walking the rings in Python
+        bounds = shape(project_map_bounds).bounds
+    except (TypeError, ValueError, IndexError, AttributeError, GEOSException):
+        bounds = None
+    update_map_view_to_bounds(bounds)
+
+def update_map_view_to_bounds(bounds):
+    '''Sets st.session_state.map_view_state from a (minx, miny, maxx, maxy) tuple, e.g. shapely's geom.bounds.'''
+    try:
+        min_lon, min_lat, max_lon, max_lat = bounds
         if min_lat == max_lat or min_lon == max_lon:
             center_lon = (min_lon + max_lon) / 2
             center_lat = (min_lat + max_lat) / 2
@@ -55,42 +67,110 @@ def update_map_view_to_project_bounds(project_map_bounds):
             longitude=center_lon, latitude=47.3769, zoom=zoom, pitch=0, bearing=0, transition_duration=1000
         )
 
+# ~1 m in degrees: simplification tolerance for the map previews of uploaded GeoJSON
+GEOJSON_SIMPLIFY_TOLERANCE = 1e-5
+GEOJSON_PREVIEW_DECIMALS = 5
+
+def _round_coordinates(coords, decimals):
+    '''Rounds a (nested) GeoJSON coordinate array to `decimals` places.'''
+    if coords and isinstance(coords[0], (int, float)):
+        return [round(c, decimals) for c in coords]
+    return [_round_coordinates(c, decimals) for c in coords]
+
+def simplify_geojson(data, tolerance=GEOJSON_SIMPLIFY_TOLERANCE, decimals=GEOJSON_PREVIEW_DECIMALS):
+    '''Returns a copy of a GeoJSON geometry, Feature, FeatureCollection or list of those with every
+    geometry simplified (topology preserved) and its coordinates rounded to `decimals` places.
+    A geometry GEOS rejects or simplifies away is kept as uploaded.'''
+    if isinstance(data, list):
+        return [simplify_geojson(item, tolerance, decimals) for item in data]
+    if not isinstance(data, dict):
+        return data
+    geojson_type = data.get("type")
+    if geojson_type == "FeatureCollection":
+        return {**data, "features": [simplify_geojson(f, tolerance, decimals) for f in data.get("features", [])]}
+    if geojson_type == "Feature":
+        return {**data, "geometry": simplify_geojson(data.get("geometry"), tolerance, decimals)}
+    if geojson_type == "GeometryCollection":
+        return {**data, "geometries": [simplify_geojson(g, tolerance, decimals) for g in data.get("geometries", [])]}
+    if "coordinates" in data:
+        try:
+            geom = shape(data).simplify(tolerance, preserve_topology=True)
+        except (TypeError, ValueError, IndexError, AttributeError, GEOSException):
+            return data
+        if geom.is_empty:
+            return data
+        simplified = mapping(geom)
+        return {**data, "coordinates": _round_coordinates(simplified["coordinates"], decimals)}
+    return data
+
+_GEOJSON_CACHE = {}
+_GEOJSON_CACHE_MAX = 16
+_GEOJSON_CACHE_LOCK = threading.Lock()
+_GEOJSON_EXECUTOR = ThreadPoolExecutor(max_workers=4)
+
+def load_geojson_upload(content, tolerance=GEOJSON_SIMPLIFY_TOLERANCE):
+    '''Parses uploaded GeoJSON bytes into (data, preview): the data as uploaded (what gets stored
+    and sent to the backend) and a simplified copy for the map layers. Memoized per process on the
+    md5 of the bytes, so reruns with the same upload skip both the decode and the GEOS work; invalid
+    input raises and is not cached. The result is shared: treat it as read-only.'''
+    key = (hashlib.md5(content).hexdigest(), tolerance)
+    with _GEOJSON_CACHE_LOCK:
+        result = _GEOJSON_CACHE.get(key)
+    if result is None:
+        data = json.loads(content)
+        result = (data, simplify_geojson(data, tolerance))
+        with _GEOJSON_CACHE_LOCK:
+            if len(_GEOJSON_CACHE) >= _GEOJSON_CACHE_MAX:
+                _GEOJSON_CACHE.pop(next(iter(_GEOJSON_CACHE)))
+            _GEOJSON_CACHE[key] = result
+    return result
+
+def submit_geojson_uploads(uploads):
+    '''Starts load_geojson_upload for every non-empty upload in {name: UploadedFile} on a shared
+    thread pool and returns {name: Future}; .result() gives (data, preview) or re-raises the parse error.'''
+    return {name: _GEOJSON_EXECUTOR.submit(load_geojson_upload, file.getvalue())
+            for name, file in uploads.items() if file}
+
 def create_geojson_feature(geometry, properties=None):
     '''Wraps a GeoJSON geometry into a GeoJSON Feature structure.'''
     if properties is None: properties = {}
     return {"type": "Feature", "geometry": geometry, "properties": properties}
 
+# Layer colours as shared tuples, so the helpers don't allocate a new default list per call
+DEFAULT_FILL_COLOR = (255, 255, 255, 100)
+DEFAULT_LINE_COLOR = (0, 0, 0, 200)
+HIGHLIGHT_COLOR = (0, 0, 128, 128)
+SITE_COLOR = (70, 130, 180, 160) # Project polygon on the dashboard and resident maps
+
 def create_pydeck_geojson_layer(
-    data, layer_id, fill_color=[255, 255, 255, 100], line_color=[0, 0, 0, 200],
+    data, layer_id, fill_color=DEFAULT_FILL_COLOR, line_color=DEFAULT_LINE_COLOR,
     line_width_min_pixels=1, get_line_width=10, opacity=0.5, stroked=True, filled=True,
     extruded=False, wireframe=True, pickable=False, tooltip_html=None, auto_highlight=True,
-    highlight_color=[0, 0, 128, 128]
+    highlight_color=HIGHLIGHT_COLOR
 ):
     '''Creates a PyDeck GeoJsonLayer with specified parameters.'''
-    layer_config = {
-        "id": layer_id, "data": data, "opacity": opacity, "stroked": stroked, "filled": filled,
-        "extruded": extruded, "wireframe": wireframe, "get_fill_color": fill_color,
-        "get_line_color": line_color, "get_line_width": get_line_width,
-        "line_width_min_pixels": line_width_min_pixels, "pickable": pickable,
-        "auto_highlight": auto_highlight, "highlight_color": highlight_color
-    }
-    if tooltip_html and pickable: layer_config["tooltip"] = {"html": tooltip_html}
-    return pdk.Layer("GeoJsonLayer", **layer_config)
+    tooltip = {"tooltip": {"html": tooltip_html}} if tooltip_html and pickable else {}
+    return pdk.Layer(
+        "GeoJsonLayer", id=layer_id, data=data, opacity=opacity, stroked=stroked, filled=filled,
+        extruded=extruded, wireframe=wireframe, get_fill_color=fill_color,
+        get_line_color=line_color, get_line_width=get_line_width,
+        line_width_min_pixels=line_width_min_pixels, pickable=pickable,
+        auto_highlight=auto_highlight, highlight_color=highlight_color, **tooltip
+    )
 
 def create_pydeck_path_layer(
     data, layer_id, get_path="path", get_color="color", get_width="width",
     width_scale=1, width_min_pixels=6, width_max_pixels=16, pickable=False, tooltip_html=None,
-    auto_highlight=True, highlight_color=[0,0,128,128]
+    auto_highlight=True, highlight_color=HIGHLIGHT_COLOR
 ):
     '''Creates a PyDeck PathLayer.'''
-    layer_config = {
-        "id": layer_id, "data": data, "pickable": pickable, "get_path": get_path,
-        "get_color": get_color, "get_width": get_width, "width_scale": width_scale,
-        "width_min_pixels": width_min_pixels, "width_max_pixels": width_max_pixels,
-        "auto_highlight": auto_highlight, "highlight_color": highlight_color
-    }
-    if tooltip_html and pickable: layer_config["tooltip"] = {"html": tooltip_html}
-    return pdk.Layer("PathLayer", **layer_config)
+    tooltip = {"tooltip": {"html": tooltip_html}} if tooltip_html and pickable else {}
+    return pdk.Layer(
+        "PathLayer", id=layer_id, data=data, pickable=pickable, get_path=get_path,
+        get_color=get_color, get_width=get_width, width_scale=width_scale,
+        width_min_pixels=width_min_pixels, width_max_pixels=width_max_pixels,
+        auto_highlight=auto_highlight, highlight_color=highlight_color, **tooltip
+    )
 
 def create_pydeck_access_route_layer(access_routes, layer_id="access_route_layer", color=[148, 0, 211, 76], width_pixels=20):
     """Create a PathLayer that highlights the construction site's access route.
@@ -129,4 +209,4 @@ def create_pydeck_access_route_layer(access_routes, layer_id="access_route_layer
         pickable=False,
         width_min_pixels=width_pixels,
         width_max_pixels=width_pixels
-    ) 
\ No newline at end of file
+    ) 